@@ -6,9 +6,13 @@ from PyQt5.QtGui import QIcon
 
 from audnauseum.state_machine.looper import Looper
 from audnauseum.gui.ui import connect_all_inputs, generate_ui
+from audnauseum.startup_timer import startup_timer
+
+startup_timer.mark('imports')
 
 # Create the State Machine
 looper = Looper()
+startup_timer.mark('engine')
 
 # Absolute path to 'looper.ui' file
 ui_file = Path(__file__).parent.absolute() / 'gui' / 'looper.ui'
@@ -27,4 +31,7 @@ app.setWindowIcon(QIcon(str(icon_file)))
 ui = generate_ui(ui_file)
 connect_all_inputs(ui, looper)
 ui.closeEvent = looper.shut_down
+startup_timer.mark('ui')
 ui.show()
+startup_timer.mark('window')
+startup_timer.report()
@@ -1,44 +1,92 @@
+from audnauseum.audio_tools.mixer import Mixer
+from audnauseum.audio_tools.ring_buffer import RingBuffer
+from audnauseum.audio_tools.telemetry import Telemetry
+from audnauseum.constants import ENGINE_MODE, SAMPLE_RATE
 from audnauseum.audio_tools.wav_reader import WavReader
 from threading import Thread
-from queue import Queue
 import time
 import math
 import numpy as np
 
+from audnauseum.data_models.fx_settings import FxSettings
 from audnauseum.data_models.loop import Loop
+from audnauseum.metronome.click_track import ClickTrack
 
 
 class Aggregator:
     """Aggregator receives multiple numpy arrays, combines, and applies FX
 
     The Aggregator requires a reference to the current Loop, the WavReader,
-    and the queue that is read by the Player.
+    and the ring buffer that is read by the Player. Blocks are mixed by a
+    Mixer, which applies the volume of every track in one operation.
+
+    The Metronome's clicks are mixed in by a ClickTrack at the exact
+    samples of the beats, including a count-in bar before the loop.
+
+    In 'push' mode a thread mixes blocks ahead into the Player's ring
+    buffer, waiting while it is full.
+    In 'pull' mode no thread is started, the Player's callback calls
+    render() to mix each block straight into the device's buffer.
 
     A new instance of Aggregator is required each time a Loop is set.
     """
     loop: Loop
     reader: WavReader
-    player_queue: Queue
+    ring: RingBuffer
     thread: Thread
     is_running: bool
-
-    def __init__(self, loop: Loop, player_queue: Queue, reader: WavReader):
+    mixer: Mixer
+    gains_revision: tuple
+    mode: str
+    restart: int
+    block: np.ndarray
+    click_track: ClickTrack
+    count_in_remaining: int
+    loop_starting: bool
+    telemetry: Telemetry
+
+    def __init__(self, loop: Loop, ring: RingBuffer, reader: WavReader,
+                 mode: str = ENGINE_MODE):
         self.loop = loop
-        self.player_queue = player_queue
+        self.ring = ring
         self.reader = reader
         self.thread = None
         self.is_running = False
+        self.mixer = Mixer(blocksize=reader.blocksize)
+        self.gains_revision = None
+        self.mode = mode
+        self.restart = None
+        # Block mixed into in 'push' mode before it is copied to the ring
+        self.block = np.zeros(
+            (self.mixer.blocksize, self.mixer.channels), dtype='float32')
+        # Set to None to leave the metronome out of the mix
+        self.click_track = ClickTrack()
+        self.count_in_remaining = 0
+        # Set when the count-in ended with a block, the loop starts with
+        # the next one
+        self.loop_starting = False
+        # Times reading and mixing each block, shared by the Looper
+        self.telemetry = Telemetry()
 
     def start(self):
         """Starts the processing of the Aggregator
 
-        Opens file handles and creates a thread to activate
-        the Reader and process the read audio data.
+        Opens file handles, loads the metronome's clicks and, in 'push'
+        mode, creates a thread to activate the Reader and process the
+        read audio data.
         """
         self.reader.open_files()
+        self.count_in_remaining = 0
+        self.loop_starting = False
+        if self.click_track is not None:
+            # Never read from disk when the first click plays
+            self.click_track.load_clicks()
+            self.count_in_remaining = self.click_track.count_in_frames(
+                self.loop.met)
         self.is_running = True
-        self.thread = Thread(target=self.process_audio)
-        self.thread.start()
+        if self.mode == 'push':
+            self.thread = Thread(target=self.process_audio)
+            self.thread.start()
 
     def stop(self):
         """Stops the processing of the Aggregator
@@ -47,7 +95,9 @@ class Aggregator:
         open file handles.
         """
         self.is_running = False
-        self.thread.join()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
         self.close_all_file_handles()
 
     def process_audio(self):
@@ -55,20 +105,24 @@ class Aggregator:
 
         The aggregator will start to continuously process audio data
         from the Reader and pass to the Player until stop() is called.
+        When the ring buffer is full it sleeps for a fraction of a block,
+        the Player's callback never waits on it.
         """
+        period = self.mixer.blocksize / SAMPLE_RATE / 4
         while self.is_running:
-            input_data = self.reader.read_to_list()
-            output_data = self.aggregate_list(input_data)
-            if output_data.any():
-                self.player_queue.put(output_data)
+            if self.ring.space < self.mixer.blocksize:
+                time.sleep(period)
+                continue
+            restart = self.render(self.block)
+            self.ring.write(self.block, restart=restart)
 
-    def add_track(self, file_path: str, slip: int = 0):
+    def add_track(self, file_path: str, slip: int = 0, fx: FxSettings = None):
         """Opens a file when a track is added during playback
 
         Calls the reader to open the specified track that was
-        added.
+        added, with the added Track's FxSettings.
         """
-        self.reader.add_track(file_path, slip=slip)
+        self.reader.add_track(file_path, slip=slip, fx=fx)
 
     def remove_track(self, file_path):
         """Closes an open file handle when a track is removed during playback
@@ -88,100 +142,109 @@ class Aggregator:
         """
         self.reader.close_all_files()
 
-    def aggregate_list(self, numpy_arrays) -> np.ndarray:
-        """Aggregates a list of numpy arrays into a single numpy array
+    def render(self, outdata: np.ndarray) -> int:
+        """Mixes the next block straight into `outdata`
 
-        The list can contain an arbitrarily large amount of tracks, but in
-        practice would be less than 10.
+        Called by the Player's callback in 'pull' mode, and by the thread
+        in 'push' mode before the block is written to the ring buffer.
 
-        A list of arrays of shape (BLOCK_SIZE,CHANNELS) are summed together to a
-        single array of that shape.
+        Returns the frame offset in the block at which the loop restarted,
+        or None if it didn't restart.
         """
-        # Uncomment to time how long this operation takes
-        # start = time.perf_counter_ns()
-        num_tracks = len(numpy_arrays)
-        max_blocksize = self.find_max_blocksize(numpy_arrays)
-
-        # Pre-allocates (malloc) the array under the hood
-        output_data: np.ndarray = np.zeros((max_blocksize, 2))
-
-        for i in range(0, len(numpy_arrays)):
-            track = self.loop.tracks[i]
-            if numpy_arrays[i].shape[0] != max_blocksize:
-                padding = np.zeros(
-                    (max_blocksize - numpy_arrays[i].shape[0], 2))
-                numpy_arrays[i] = np.append(
-                    numpy_arrays[i], padding, 0)
-            # volume adjustment
-            np.multiply(
-                numpy_arrays[i], track.fx.volume, numpy_arrays[i])
-            # Add element-wise in-place to reuse allocated memory
-            np.add(output_data, numpy_arrays[i], output_data)
-
-        np.multiply(output_data, 1. / math.sqrt(num_tracks), output_data)
-        np.multiply(output_data, self.loop.fx.volume, output_data)
-        # print(f'Aggregator.aggregate_list: {time.perf_counter_ns() - start}')
-        # print(time.perf_counter_ns() - start)
-        return output_data
-
-    def find_max_blocksize(self, numpy_arrays) -> int:
-        """Finds the largest blocksize in a list of numpy arrays
-
-        In case the arrays aren't exactly the same size, return
-        the size of the largest array.
+        self.read_and_mix(out=outdata)
+        return self.restart
+
+    def read_and_mix(self, out: np.ndarray = None) -> np.ndarray:
+        """Reads the next block of every track and mixes it
+
+        The reader writes straight into the mixer's preallocated stack.
+        During the count-in the tracks are silent and the loop starts
+        where it ends, a restart is signalled at that frame. A count-in
+        that ends with a block signals the restart at the first frame of
+        the next block. Returns the mixed (BLOCK_SIZE, CHANNELS) block,
+        written into `out` if given.
         """
-        max_blocksize = 0
-        for block in numpy_arrays:
-            block_length = block.shape[0]
-            if block_length > max_blocksize:
-                max_blocksize = block_length
-        return max_blocksize
-
-
-def aggregate_3d_array(self, numpy_3d_array):
-    """Aggregates a 3d array to a summed 2d array
-
-    Aggregates a 3d array of shape (BLOCK_SIZE, CHANNELS, X) into a single
-    array of shape (BLOCK_SIZE, CHANNELS).
+        started = self.telemetry.start()
+        self.reader.admit_tracks()
+        num_tracks = len(self.reader.files)
+        self.mixer.resize(num_tracks)
+        self.update_gains(num_tracks)
+
+        stack = self.mixer.stack
+        count_in = min(self.count_in_remaining, self.mixer.blocksize)
+        if count_in:
+            # Click grid position of the first frame, before the loop
+            position = -self.count_in_remaining
+            stack[:count_in] = 0
+            self.count_in_remaining -= count_in
+        else:
+            position = self.reader.read_cursor
+        self.restart = self.reader.read_into(stack[count_in:])
+        if self.restart is not None:
+            self.restart += count_in
+        elif self.loop_starting:
+            self.restart = 0
+        elif count_in and self.count_in_remaining == 0:
+            if count_in < self.mixer.blocksize:
+                self.restart = count_in
+            else:
+                self.loop_starting = True
+        if self.restart is not None:
+            self.loop_starting = False
+        self.telemetry.stop('read', started)
+
+        started = self.telemetry.start()
+        if out is None:
+            out = np.empty(
+                (self.mixer.blocksize, self.mixer.channels), dtype='float32')
+        self.mixer.mix(out)
+        if self.click_track is not None:
+            self.click_track.render(out, self.loop.met, position, self.restart)
+        self.telemetry.stop('mix', started)
+        return out
+
+    def aggregate_list(self, numpy_arrays, out: np.ndarray = None) -> np.ndarray:
+        """Aggregates a list of numpy arrays into a single numpy array
 
-    (BLOCK_SIZE, CHANNELS, X) --> (BLOCK_SIZE, CHANNELS)
-    """
-    # Uncomment to time how long this operation takes
-    start = time.perf_counter_ns()
-    num_tracks = numpy_3d_array.shape[2]
-    max_blocksize = self.find_max_blocksize_3d(numpy_3d_array)
-    # print(self.find_max_blocksize_3d(numpy_3d_array))
-
-    # Pre-allocates (malloc) the array under the hood
-    output_data: np.ndarray = np.zeros((max_blocksize, 2))
-    for block in range(numpy_3d_array.shape[-1]):
-        current_block_size = numpy_3d_array[..., block].shape[0]
-        if current_block_size != max_blocksize:
-            padding = np.zeros(
-                (max_blocksize - current_block_size, 2))
-            numpy_3d_array[..., block] = np.append(
-                numpy_3d_array[..., block], padding, 0)
-        # Add element-wise in-place to reuse allocated memory
-        output_data = np.sum(numpy_3d_array, axis=2)
-
-    np.multiply(output_data, 1. / num_tracks, output_data)
-    # print(f'Aggregator.aggregate_list: {time.perf_counter_ns() - start}')
-
-    print(time.perf_counter_ns() - start)
-    return output_data
-
-
-def find_max_blocksize_3d(self, numpy_3d_array) -> int:
-    """Finds the largest blocksize in a 3d numpy array
-
-    In case the arrays aren't exactly the same size, return
-    the size of the largest array.
-    """
-    max_blocksize = 0
-    for block in range(numpy_3d_array.shape[-1]):
-        # print("Numpy block")
-        # print(numpy_3d_array[..., block])
-        current_block_length = numpy_3d_array[..., block].shape[0]
-        if current_block_length > max_blocksize:
-            max_blocksize = current_block_length
-    return max_blocksize
+        The list holds one block per file of the reader, as returned by
+        WavReader.read_to_list. Blocks of shape (<= BLOCK_SIZE, CHANNELS)
+        are copied into the mixer's stack and summed together into a
+        single (BLOCK_SIZE, CHANNELS) array, written into `out` if given.
+        """
+        started = self.telemetry.start()
+        num_tracks = len(numpy_arrays)
+        self.mixer.resize(num_tracks)
+        self.update_gains(num_tracks)
+
+        stack = self.mixer.stack
+        for i, block in enumerate(numpy_arrays):
+            stack[:block.shape[0], i] = block
+            stack[block.shape[0]:, i] = 0
+
+        if out is None:
+            out = np.empty(
+                (self.mixer.blocksize, self.mixer.channels), dtype='float32')
+        self.mixer.mix(out)
+        self.telemetry.stop('mix', started)
+        return out
+
+    def update_gains(self, num_tracks: int):
+        """Rebuilds the mixer's gains if an FxSetting or the track list changed
+
+        The gain of a track is its volume, scaled by the loop volume and
+        normalized by the square root of the number of tracks. Each track
+        is panned by its own pan and then by the loop's pan.
+        """
+        revision = (FxSettings.revision, self.reader.revision,
+                    id(self.loop), num_tracks)
+        if revision == self.gains_revision:
+            return
+        self.gains_revision = revision
+
+        if num_tracks == 0:
+            return
+        files = self.reader.files[:num_tracks]
+        scale = self.loop.fx.volume / math.sqrt(num_tracks)
+        self.mixer.set_gains([file.fx.volume * scale for file in files],
+                             pans=[file.fx.pan for file in files],
+                             master_pan=self.loop.fx.pan)
@@ -0,0 +1,297 @@
+import threading
+from time import perf_counter, sleep
+from types import SimpleNamespace
+
+import numpy as np
+
+from audnauseum.constants import AUDIO_BACKEND, BLOCK_SIZE, CHANNELS, SAMPLE_RATE
+
+
+class CallbackFlags:
+    """Status of a block passed to a callback, like sounddevice's"""
+    input_overflow: bool
+    output_underflow: bool
+
+    def __init__(self, input_overflow: bool = False, output_underflow: bool = False):
+        self.input_overflow = input_overflow
+        self.output_underflow = output_underflow
+
+    def __bool__(self):
+        return self.input_overflow or self.output_underflow
+
+
+class CallbackStop(Exception):
+    """Raised by a callback to stop its virtual stream"""
+
+
+class CallbackAbort(Exception):
+    """Raised by a callback to abort its virtual stream"""
+
+
+class SoundDeviceBackend:
+    """The sounddevice module, imported the first time a device is used
+
+    Importing sounddevice loads PortAudio, so the engine can be imported
+    and tested on machines without it. Every attribute is sounddevice's,
+    e.g. backend.OutputStream or backend.default.
+    """
+
+    def __init__(self):
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            import sounddevice
+            self._module = sounddevice
+        return self._module
+
+    def __getattr__(self, name: str):
+        return getattr(self.module, name)
+
+
+class VirtualStream:
+    """A stream of the VirtualBackend
+
+    Takes the arguments of sounddevice's streams. Its callback is called
+    for every block by its own thread, or by VirtualBackend.step().
+    """
+    backend: 'VirtualBackend'
+    kind: str
+    callback: object
+    blocksize: int
+    samplerate: int
+    input_channels: int
+    output_channels: int
+    active: bool
+    frame: int
+
+    def __init__(self, backend: 'VirtualBackend', kind: str, callback=None,
+                 blocksize: int = None, channels=None, samplerate: int = None,
+                 dtype: str = 'float32', **kwargs):
+        self.backend = backend
+        self.kind = kind
+        self.callback = callback
+        self.blocksize = blocksize or backend.blocksize
+        self.samplerate = samplerate or backend.default.samplerate
+        input_channels, output_channels = backend.default.channels
+        if kind == 'duplex':
+            input_channels, output_channels = channels or (input_channels, output_channels)
+        elif kind == 'input':
+            input_channels, output_channels = channels or input_channels, 0
+        else:
+            input_channels, output_channels = 0, channels or output_channels
+        self.input_channels = input_channels
+        self.output_channels = output_channels
+        self.outdata = np.zeros((self.blocksize, output_channels), dtype=dtype)
+        self.active = False
+        self.frame = 0
+        self._late = False
+        self._thread = None
+
+    def start(self):
+        self.active = True
+        self.backend.streams.append(self)
+        if self.backend.mode != 'manual':
+            self._thread = threading.Thread(target=self.run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self.active = False
+        if self in self.backend.streams:
+            self.backend.streams.remove(self)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def close(self):
+        self.stop()
+
+    def run(self):
+        """Calls the callback for every block until the stream is stopped
+
+        In 'realtime' mode each block is due one block's duration after
+        the previous one. A callback that returns after the next block
+        was due is an xrun: the next block is flagged as an underflow or
+        overflow, like a device flags it, and the clock starts again from
+        there. In 'fast' mode the blocks follow each other at once.
+        """
+        started = perf_counter()
+        while self.active:
+            self.process()
+            if self.backend.mode == 'realtime':
+                wait = started + self.frame / self.samplerate - perf_counter()
+                self._late = wait < 0
+                if self._late:
+                    self.backend.xruns += 1
+                    started -= wait
+                else:
+                    sleep(wait)
+            else:
+                # Lets the threads feeding the callback run
+                sleep(0)
+
+    def process(self):
+        """Calls the callback for one block, with the scripted input"""
+        frames = self.blocksize
+        status = CallbackFlags(input_overflow=self._late and self.input_channels > 0,
+                               output_underflow=self._late and self.output_channels > 0)
+        self._late = False
+        now = self.frame / self.samplerate
+        time = SimpleNamespace(currentTime=now, inputBufferAdcTime=now,
+                               outputBufferDacTime=now + frames / self.samplerate)
+        self.backend.busy(frames / self.samplerate)
+        indata = self.backend.input_block(self.frame, frames, self.input_channels)
+        try:
+            if self.kind == 'duplex':
+                self.callback(indata, self.outdata, frames, time, status)
+            elif self.kind == 'input':
+                self.callback(indata, frames, time, status)
+            else:
+                self.callback(self.outdata, frames, time, status)
+        except (CallbackStop, CallbackAbort):
+            self.active = False
+        if self.output_channels:
+            self.backend.capture(self.outdata)
+        self.frame += frames
+
+
+class VirtualBackend:
+    """A virtual audio device that runs without sound hardware
+
+    Stands in for sounddevice with the same streams and device queries.
+    Stream callbacks are driven by a simulated clock in one of three modes:
+
+    'realtime': every stream's thread calls its callback once per block's
+                duration, callbacks that overrun their block are xruns
+    'fast':     the threads call the callbacks back to back
+    'manual':   no threads, step() calls every callback a number of
+                blocks, e.g. for deterministic tests
+
+    Input streams are fed `input_signal`, an array of (frames, channels)
+    played in a loop, or a function of the frame position and the number
+    of frames that returns the block. Without one the input is silent.
+    The output blocks are captured and returned by output().
+
+    A synthetic CPU load keeps the clock's thread busy for a fraction of
+    every block before the callback is called.
+    """
+    mode: str
+    blocksize: int
+    default: SimpleNamespace
+    input_signal: object
+    load: float
+    streams: list
+    captured: list
+    xruns: int
+
+    def __init__(self, mode: str = 'realtime', input_signal=None,
+                 samplerate: int = SAMPLE_RATE, channels: tuple = (CHANNELS, CHANNELS),
+                 blocksize: int = BLOCK_SIZE, load: float = 0., capture: bool = True):
+        self.mode = mode
+        self.blocksize = blocksize
+        # Like sounddevice.default, the channels are (input, output)
+        self.default = SimpleNamespace(channels=channels, samplerate=samplerate)
+        self.input_signal = input_signal
+        self.load = load
+        self.streams = []
+        self.captured = [] if capture else None
+        self.xruns = 0
+
+    def query_hostapis(self, index: int = None):
+        host_apis = [{'name': 'Virtual', 'devices': [0],
+                      'default_input_device': 0, 'default_output_device': 0}]
+        return host_apis if index is None else host_apis[index]
+
+    def query_devices(self, device: int = None, kind: str = None):
+        input_channels, output_channels = self.default.channels
+        devices = [{'name': 'Virtual Device', 'hostapi': 0,
+                    'max_input_channels': input_channels,
+                    'max_output_channels': output_channels,
+                    'default_samplerate': self.default.samplerate}]
+        if device is None and kind is None:
+            return devices
+        return devices[device or 0]
+
+    def OutputStream(self, **kwargs) -> VirtualStream:
+        return VirtualStream(self, 'output', **kwargs)
+
+    def InputStream(self, **kwargs) -> VirtualStream:
+        return VirtualStream(self, 'input', **kwargs)
+
+    def Stream(self, **kwargs) -> VirtualStream:
+        return VirtualStream(self, 'duplex', **kwargs)
+
+    CallbackFlags = CallbackFlags
+    CallbackStop = CallbackStop
+    CallbackAbort = CallbackAbort
+
+    def step(self, blocks: int = 1):
+        """Calls the callback of every started stream, in 'manual' mode"""
+        for _ in range(blocks):
+            for stream in list(self.streams):
+                if stream.active:
+                    stream.process()
+
+    def input_block(self, position: int, frames: int, channels: int) -> np.ndarray:
+        """Block of the input signal at a frame position"""
+        if self.input_signal is None or channels == 0:
+            return np.zeros((frames, channels), dtype='float32')
+        if callable(self.input_signal):
+            return self.input_signal(position, frames)
+        signal = self.input_signal
+        indices = (position + np.arange(frames)) % signal.shape[0]
+        columns = np.arange(channels) % signal.shape[1]
+        return signal[indices][:, columns].astype('float32')
+
+    def capture(self, outdata: np.ndarray):
+        if self.captured is not None:
+            self.captured.append(outdata.copy())
+
+    def output(self) -> np.ndarray:
+        """Every output block played so far, as (frames, channels)"""
+        if not self.captured:
+            return np.zeros((0, self.default.channels[1]), dtype='float32')
+        return np.concatenate(self.captured)
+
+    def busy(self, seconds: float):
+        """Spins for the synthetic load's share of a block's duration"""
+        if self.load:
+            until = perf_counter() + self.load * seconds
+            while perf_counter() < until:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            'mode': self.mode,
+            'streams': len(self.streams),
+            'captured_frames': sum(block.shape[0] for block in self.captured or []),
+            'xruns': self.xruns,
+        }
+
+
+# The backend used by every component, created on first use
+_backend = None
+
+
+def create_backend(name: str):
+    """Creates a backend by name: 'sounddevice' or 'virtual'"""
+    if name == 'sounddevice':
+        return SoundDeviceBackend()
+    if name == 'virtual':
+        return VirtualBackend()
+    raise ValueError(f'Unknown audio backend: {name}')
+
+
+def get_backend():
+    """Returns the audio backend, AUDIO_BACKEND unless one was set"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(AUDIO_BACKEND)
+    return _backend
+
+
+def set_backend(backend):
+    """Replaces the audio backend, before any device is opened"""
+    global _backend
+    _backend = backend
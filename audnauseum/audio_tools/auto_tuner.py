@@ -0,0 +1,154 @@
+import json
+import time
+from datetime import datetime
+
+from audnauseum.audio_tools.aggregator import Aggregator
+from audnauseum.audio_tools.audio_backend import get_backend
+from audnauseum.audio_tools.device_manager import DeviceManager
+from audnauseum.audio_tools.player import Player
+from audnauseum.audio_tools.track_cache import TrackCache
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.constants import ENGINE_MODE, SETTINGS_FILE, TUNER_BLOCK_SIZES, \
+    TUNER_BUFFER_BLOCKS, TUNER_MAX_LOAD, TUNER_TRIAL_SECONDS
+from audnauseum.data_models.loop import Loop
+from audnauseum.data_models.track import Track
+
+
+def device_name(backend=None) -> str:
+    """Name of the default output device and its host API"""
+    try:
+        if backend is None:
+            backend = get_backend()
+        device = backend.query_devices(kind='output')
+        host_api = backend.query_hostapis(device['hostapi'])['name']
+        return f"{device['name']} ({host_api})"
+    except Exception:
+        return 'default'
+
+
+def read_settings(path: str = SETTINGS_FILE) -> dict:
+    """Reads the settings file, an empty or missing file has no settings"""
+    try:
+        with open(path, 'r') as f:
+            return json.loads(f.read() or '{}')
+    except (OSError, ValueError):
+        return {}
+
+
+def load_tuning(device: str, path: str = SETTINGS_FILE) -> dict:
+    """Returns the saved tuning of a device, or None if it wasn't tuned"""
+    return read_settings(path).get('devices', {}).get(device)
+
+
+def save_tuning(device: str, tuning: dict, path: str = SETTINGS_FILE):
+    """Saves the tuning of a device, keeping the other settings"""
+    settings = read_settings(path)
+    settings.setdefault('devices', {})[device] = tuning
+    with open(path, 'w') as f:
+        json.dump(settings, f, indent=4)
+
+
+class AutoTuner:
+    """Finds the lowest latency the output device plays without xruns
+
+    Each candidate block size and ring buffer depth is played on the
+    actual device with the Loop's tracks, from the lowest latency up.
+    The first candidate without underflows, whose longest callback stays
+    within TUNER_MAX_LOAD of a block, is saved for the device so later
+    sessions start with it.
+
+    In 'pull' mode nothing is buffered between mixing and playback, so
+    only block sizes are tried.
+    """
+    loop: Loop
+    mode: str
+    trial_seconds: float
+    track_cache: TrackCache
+    results: list
+
+    def __init__(self, loop: Loop, mode: str = ENGINE_MODE,
+                 trial_seconds: float = TUNER_TRIAL_SECONDS):
+        self.loop = loop
+        self.mode = mode
+        self.trial_seconds = trial_seconds
+        self.track_cache = TrackCache()
+        self.results = []
+
+    def candidates(self) -> list:
+        """(blocksize, buffer_frames) pairs, from the lowest latency up"""
+        depths = TUNER_BUFFER_BLOCKS if self.mode == 'push' else (1,)
+        pairs = [(blocksize, blocksize * depth)
+                 for blocksize in TUNER_BLOCK_SIZES for depth in depths]
+        return sorted(pairs, key=lambda pair: (pair[1], pair[0]))
+
+    def trial(self, blocksize: int, buffer_frames: int) -> dict:
+        """Plays the Loop at a setting and returns the Player's statistics
+
+        Statistics gathered while the stream and buffer are warming up are
+        discarded.
+        """
+        player = Player(loop=self.loop, blocksize=blocksize,
+                        buffer_frames=buffer_frames)
+        reader = WavReader(self.loop, blocksize=blocksize,
+                           track_cache=self.track_cache)
+        aggregator = Aggregator(self.loop, ring=player.ring, reader=reader,
+                                mode=self.mode)
+        if self.mode == 'pull':
+            player.source = aggregator
+        devices = DeviceManager(player, blocksize=blocksize)
+        devices.open()
+        try:
+            aggregator.start()
+            player.play()
+            time.sleep(0.5)
+            player.reset_stats()
+            time.sleep(self.trial_seconds)
+            stats = player.stats()
+        finally:
+            aggregator.stop()
+            player.stop()
+            devices.close()
+        stats['stable'] = self.is_stable(stats)
+        return stats
+
+    @staticmethod
+    def is_stable(stats: dict) -> bool:
+        return stats['underflows'] == 0 and stats['output_underflows'] == 0 \
+            and stats['load'] < TUNER_MAX_LOAD
+
+    def tune(self, device: str = None, path: str = SETTINGS_FILE) -> dict:
+        """Tries every candidate until one is stable and saves it
+
+        If none is stable, the highest latency candidate is saved.
+        Returns the saved tuning.
+        """
+        if device is None:
+            device = device_name()
+        self.results = []
+        for blocksize, buffer_frames in self.candidates():
+            stats = self.trial(blocksize, buffer_frames)
+            self.results.append(stats)
+            print(f'{blocksize=} {buffer_frames=} '
+                  f'load={stats["load"]:.2f} stable={stats["stable"]}')
+            if stats['stable']:
+                break
+
+        stats = self.results[-1]
+        tuning = {
+            'blocksize': stats['blocksize'],
+            'buffer_frames': stats['buffer_frames'],
+            'mode': self.mode,
+            'load': round(stats['load'], 3),
+            'stable': stats['stable'],
+            'tuned': datetime.now().isoformat(timespec='seconds'),
+        }
+        save_tuning(device, tuning, path)
+        return tuning
+
+
+if __name__ == '__main__':
+    # Tunes the default output device while playing the demo recordings
+    loop = Loop(tracks=[Track('resources/recordings/bass4-4.wav'),
+                        Track('resources/recordings/beat4-4.wav')])
+    print(f'Tuning {device_name()}')
+    print(AutoTuner(loop).tune())
@@ -0,0 +1,75 @@
+from functools import lru_cache
+
+import numpy as np
+
+from audnauseum.constants import CHANNELS
+
+
+# Speakers of the default WAV channel order of each channel count,
+# channels past the last speaker are treated like a centre
+WAV_LAYOUTS = {
+    2: ('L', 'R'),
+    3: ('L', 'R', 'C'),
+    4: ('L', 'R', 'Ls', 'Rs'),
+    5: ('L', 'R', 'C', 'Ls', 'Rs'),
+    6: ('L', 'R', 'C', 'LFE', 'Ls', 'Rs'),
+    7: ('L', 'R', 'C', 'LFE', 'Cs', 'Ls', 'Rs'),
+    8: ('L', 'R', 'C', 'LFE', 'Ls', 'Rs', 'Lss', 'Rss'),
+}
+
+# Gain of every speaker but the front left and right, -3 dB
+SPEAKER_GAIN = 1 / np.sqrt(2)
+
+
+@lru_cache(maxsize=None)
+def downmix_matrix(source_channels: int, channels: int = CHANNELS) -> np.ndarray:
+    """Returns the (source_channels, channels) matrix of a downmix
+
+    To stereo, the source channels are taken in WAV order: the front
+    left and right go to their side, every other left or right speaker
+    goes to its side at -3 dB and the centre, LFE and other speakers go
+    to both sides at -3 dB. Any other layout sums every source channel
+    into every output.
+
+    The whole matrix is scaled by one factor, so the power of the
+    loudest output is that of a single uncorrelated channel and the
+    sides stay balanced. The matrix is built once per layout and is
+    read-only.
+    """
+    matrix = np.zeros((source_channels, channels), dtype='float32')
+    if channels == 2:
+        layout = WAV_LAYOUTS.get(source_channels, WAV_LAYOUTS[8])
+        for index in range(source_channels):
+            speaker = layout[index] if index < len(layout) else 'C'
+            gain = 1. if speaker in ('L', 'R') else SPEAKER_GAIN
+            if speaker.startswith('L') and speaker != 'LFE':
+                matrix[index, 0] = gain
+            elif speaker.startswith('R'):
+                matrix[index, 1] = gain
+            else:
+                matrix[index] = gain
+    else:
+        matrix[:] = 1
+    matrix /= np.sqrt(np.square(matrix).sum(axis=0).max())
+    matrix.flags.writeable = False
+    return matrix
+
+
+def normalize_layout(data: np.ndarray, channels: int = CHANNELS) -> np.ndarray:
+    """Returns (frames, channels) audio in the mixer's channel layout
+
+    Mono audio is broadcast to every channel as a read-only view whose
+    channel stride is 0, so it is never copied. Audio with more channels
+    is downmixed once. Audio already in the layout is returned as is.
+    """
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    source_channels = data.shape[1]
+    if source_channels == channels:
+        return data
+    if source_channels == 1:
+        return np.broadcast_to(data, (data.shape[0], channels))
+    if source_channels > channels:
+        return data @ downmix_matrix(source_channels, channels)
+    # Fewer channels than the layout, but more than one: pad with silence
+    return np.pad(data, ((0, 0), (0, channels - source_channels)))
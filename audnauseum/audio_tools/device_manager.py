@@ -0,0 +1,119 @@
+from time import perf_counter
+
+from audnauseum.audio_tools.audio_backend import CallbackFlags, get_backend
+from audnauseum.audio_tools.player import Player
+from audnauseum.audio_tools.recorder import Recorder
+from audnauseum.constants import BLOCK_SIZE, CHANNELS, DUPLEX_STREAM, SAMPLE_RATE
+
+
+class DeviceManager:
+    """Opens the session's audio streams once and routes their callbacks
+
+    Opening a device takes tens to hundreds of milliseconds and can
+    glitch other audio, so the streams are opened the first time audio
+    plays or records and kept running until AudNauseum shuts down.
+    Transport actions never touch them: the Player and Recorder gate
+    their data inside the callbacks.
+
+    Either an output and an input stream are opened, or in duplex mode a
+    single full-duplex stream whose callback both plays and records. The
+    duplex callback hands each input block to the Recorder with the loop
+    position of the output block it plays, so recordings line up with
+    the loop at the exact sample.
+
+    The streams are opened with the audio backend, sounddevice unless a
+    virtual device was chosen.
+    """
+    player: Player
+    recorder: Recorder
+    duplex: bool
+    blocksize: int
+    samplerate: int
+    input_channels: int
+    backend: object
+    output_stream: object
+    input_stream: object
+    open_time: float
+
+    def __init__(self, player: Player, recorder: Recorder = None, duplex: bool = DUPLEX_STREAM,
+                 blocksize: int = BLOCK_SIZE, samplerate: int = SAMPLE_RATE, backend=None):
+        self.backend = backend
+        if self.backend is None:
+            self.backend = get_backend()
+        self.player = player
+        self.recorder = recorder
+        self.duplex = duplex
+        self.blocksize = blocksize
+        self.samplerate = samplerate
+        # Set when opening, from the backend's default input channels
+        self.input_channels = None
+        self.output_stream = None
+        self.input_stream = None
+        self.open_time = None
+
+    def open(self):
+        """Opens and starts the streams, once per session"""
+        if self.is_open:
+            return
+        started = perf_counter()
+        self.input_channels = self.backend.default.channels[0]
+        if self.duplex:
+            self.output_stream = self.input_stream = self.backend.Stream(
+                blocksize=self.blocksize, dtype='float32',
+                channels=(self.input_channels, CHANNELS),
+                samplerate=self.samplerate, callback=self.duplex_callback)
+        else:
+            self.output_stream = self.backend.OutputStream(
+                blocksize=self.blocksize, dtype='float32', channels=CHANNELS,
+                samplerate=self.samplerate, callback=self.player.callback)
+            self.input_stream = self.backend.InputStream(
+                dtype='float32', channels=self.input_channels,
+                samplerate=self.samplerate, callback=self.input_callback)
+            self.input_stream.start()
+        self.output_stream.start()
+        self.open_time = perf_counter() - started
+
+    @property
+    def is_open(self) -> bool:
+        return self.output_stream is not None
+
+    def close(self):
+        """Closes the streams, called when shutting down"""
+        for stream in {self.output_stream, self.input_stream}:
+            if stream is not None:
+                stream.close()
+        self.output_stream = self.input_stream = None
+
+    def input_callback(self, indata, frames: int, time, status: CallbackFlags):
+        """Callback of the input stream, passes each block to the Recorder"""
+        if self.recorder is not None:
+            self.recorder.audio_callback(indata, frames, time, status)
+
+    def duplex_callback(self, indata, outdata, frames: int, time, status: CallbackFlags):
+        """Callback of the duplex stream, plays a block and records one
+
+        The input block is recorded at the loop position of the output
+        block of the same callback, both run on the device's one clock.
+        """
+        position = self.player.loop.audio_cursor
+        self.player.callback(outdata, frames, time, status)
+        if self.recorder is not None:
+            self.recorder.audio_callback(indata, frames, time, status,
+                                         position=position)
+
+    def stats(self) -> dict:
+        """Returns how long opening the devices and each transport took
+
+        Transport times run from the request to the first block of the
+        callback that acted on it, in seconds.
+        """
+        stats = {
+            'duplex': self.duplex,
+            'open_time': self.open_time,
+            'play_latency': self.player.play_latency,
+            'stop_latency': self.player.stop_latency,
+        }
+        if self.recorder is not None:
+            stats['record_latency'] = self.recorder.record_latency
+            stats['take_latency'] = self.recorder.stop_latency
+        return stats
@@ -0,0 +1,97 @@
+import numpy as np
+
+from audnauseum.constants import BLOCK_SIZE, CHANNELS
+
+
+def pan_matrices(pans) -> np.ndarray:
+    """Converts pan positions into constant-power stereo gain matrices
+
+    A pan of -1 is hard left, 0 is center and 1 is hard right. Returns one
+    (CHANNELS, CHANNELS) matrix per pan, mapping input to output channels.
+    The left channel is scaled by cos and the right one by sin of the pan
+    angle, so a mono track, the same signal on both channels, keeps its
+    power: unity on one side when hard panned, -3 dB per side at center.
+    Channels are never folded into each other, a pan can't clip a track.
+    """
+    pans = np.clip(np.asarray(pans, dtype='float32'), -1., 1.)
+    angle = (pans + 1) * (np.pi / 4)
+    matrices = np.zeros((pans.shape[0], 2, 2), dtype='float32')
+    matrices[:, 0, 0] = np.cos(angle)
+    matrices[:, 1, 1] = np.sin(angle)
+    return matrices
+
+
+def balance_matrix(pan: float) -> np.ndarray:
+    """Converts the loop's pan into a stereo balance matrix
+
+    The mix is already panned track by track, so the loop's pan only
+    turns down the side panned away from: center is unity and nothing
+    is ever boosted.
+    """
+    pan = float(np.clip(pan, -1., 1.))
+    return np.diag([min(1., 1. - pan), min(1., 1. + pan)]).astype('float32')
+
+
+class Mixer:
+    """Mixes a batch of track blocks with a single matrix product
+
+    The blocks of all tracks are written into one preallocated stack of
+    shape (BLOCK_SIZE, TRACKS, CHANNELS). Frames are the outer axis so the
+    stack can be viewed as a (BLOCK_SIZE, TRACKS * CHANNELS) matrix and the
+    whole mix is one matmul with a (TRACKS * CHANNELS, CHANNELS) weight
+    matrix, written straight into an interleaved output block.
+
+    The weight matrix holds the gain and pan of every track, with the
+    master pan folded in, so panning costs nothing extra per block. It is
+    only rebuilt when the gains change. Nothing is allocated per block
+    unless the number of tracks changes.
+    """
+    blocksize: int
+    channels: int
+    stack: np.ndarray
+    weights: np.ndarray
+
+    def __init__(self, blocksize: int = BLOCK_SIZE, channels: int = CHANNELS, tracks: int = 0):
+        self.blocksize = blocksize
+        self.channels = channels
+        self.stack = None
+        self.weights = None
+        self.resize(tracks)
+
+    @property
+    def tracks(self) -> int:
+        return self.stack.shape[1]
+
+    def resize(self, tracks: int):
+        """Reallocates the stack when the number of tracks changes"""
+        if self.stack is not None and self.stack.shape[1] == tracks:
+            return
+        self.stack = np.zeros(
+            (self.blocksize, tracks, self.channels), dtype='float32')
+        self.weights = np.zeros(
+            (tracks * self.channels, self.channels), dtype='float32')
+
+    def set_gains(self, gains, pans=None, master_pan: float = 0.):
+        """Sets the gain and pan of each track, one per track in the stack
+
+        Each track gets a (CHANNELS, CHANNELS) block of the weight matrix:
+        its gain times its pan matrix times the master balance matrix.
+        Without pans every channel of a track is scaled equally.
+        """
+        gains = np.asarray(gains, dtype='float32')
+        if pans is None or self.channels != 2:
+            self.weights[:] = np.kron(
+                gains[:, np.newaxis], np.eye(self.channels, dtype='float32'))
+            return
+        matrices = pan_matrices(pans) @ balance_matrix(master_pan)
+        matrices *= gains[:, np.newaxis, np.newaxis]
+        self.weights[:] = matrices.reshape(-1, self.channels)
+
+    def mix(self, out: np.ndarray) -> np.ndarray:
+        """Mixes the stack into a (BLOCK_SIZE, CHANNELS) float32 block
+
+        The product of the flattened stack and the weight matrix sums the
+        scaled channels of all tracks in a single BLAS call.
+        """
+        flat = self.stack.reshape(self.blocksize, -1)
+        return np.matmul(flat, self.weights, out=out)
@@ -0,0 +1,175 @@
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+import soundfile as sf
+
+from audnauseum.audio_tools.aggregator import Aggregator
+from audnauseum.audio_tools.pcm_store import PcmStore
+from audnauseum.audio_tools.pitch_shifter import PitchShifter
+from audnauseum.audio_tools.track_cache import TrackCache
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.constants import CHANNELS, OFFLINE_BLOCK_SIZE, OFFLINE_WORKERS, SAMPLE_RATE
+from audnauseum.data_models.complex_decoder import ComplexDecoder
+from audnauseum.data_models.loop import Loop
+
+
+def read_loop(file_path: str) -> Loop:
+    """Reads a Loop from its JSON file"""
+    with open(file_path, 'r') as f:
+        return json.loads(f.read(), cls=ComplexDecoder)
+
+
+def output_path(loop_path: str, output_directory: str, format: str = 'wav') -> str:
+    """Path of the file a Loop file is rendered to, named after the Loop"""
+    name = os.path.splitext(os.path.basename(loop_path))[0]
+    return os.path.join(output_directory, f'{name}.{format}')
+
+
+class OfflineRenderer:
+    """Mixes a Loop to an audio file without an audio device
+
+    Drives the same WavReader and Aggregator as playback, so the file
+    sounds exactly as the Loop plays, but mixes as fast as the CPU
+    allows in blocks much larger than the device's. Pitch-shifted tracks
+    are rendered before mixing starts instead of in the background.
+
+    The metronome is left out of the mix unless `click` is set. There is
+    no count-in, the file starts with the loop.
+
+    Without a TrackCache, one backed by a PcmStore is created, so tracks
+    recorded at another sample rate are resampled like they are for
+    playback.
+    """
+    repetitions: int
+    blocksize: int
+    click: bool
+    track_cache: TrackCache
+    pitch_shifter: PitchShifter
+
+    def __init__(self, repetitions: int = 1, blocksize: int = OFFLINE_BLOCK_SIZE,
+                 click: bool = False, track_cache: TrackCache = None):
+        self.repetitions = repetitions
+        self.blocksize = blocksize
+        self.click = click
+        self.track_cache = track_cache
+        if self.track_cache is None:
+            self.track_cache = TrackCache(store=PcmStore())
+        self.pitch_shifter = PitchShifter(self.track_cache)
+
+    def render(self, loop: Loop) -> np.ndarray:
+        """Returns `repetitions` passes of the mixed Loop
+
+        The blocks are mixed straight into the returned array of shape
+        (frames, CHANNELS).
+        """
+        for track in loop.tracks:
+            self.pitch_shifter.render(track.file_name, track.fx.pitch_adjust)
+
+        reader = WavReader(loop, blocksize=self.blocksize,
+                           track_cache=self.track_cache,
+                           pitch_shifter=self.pitch_shifter)
+        # The Aggregator is pulled like a Player in 'pull' mode, there is
+        # no ring buffer to fill
+        aggregator = Aggregator(loop, ring=None, reader=reader, mode='pull')
+        if not self.click:
+            aggregator.click_track = None
+        reader.open_files()
+
+        frames = reader.loop_length * self.repetitions
+        blocks = -(-frames // self.blocksize)
+        out = np.empty((blocks * self.blocksize, CHANNELS), dtype='float32')
+        for start in range(0, frames, self.blocksize):
+            aggregator.render(out[start:start + self.blocksize])
+        reader.close_all_files()
+        return out[:frames]
+
+    def render_file(self, loop_path: str, output_path: str) -> dict:
+        """Renders a Loop file to an audio file, see write()"""
+        result = self.write(read_loop(loop_path), output_path)
+        result['loop'] = loop_path
+        return result
+
+    def write(self, loop: Loop, output_path: str) -> dict:
+        """Renders a Loop to an audio file
+
+        The format follows the extension of `output_path`, e.g. WAV or
+        FLAC. Returns the length of the audio and how much faster than
+        real time it was rendered.
+        """
+        started = perf_counter()
+        audio = self.render(loop)
+        sf.write(output_path, audio, SAMPLE_RATE)
+        elapsed = perf_counter() - started
+        seconds = audio.shape[0] / SAMPLE_RATE
+        return {
+            'output': output_path,
+            'seconds': seconds,
+            'elapsed': elapsed,
+            'speed': seconds / elapsed if elapsed else 0.,
+        }
+
+
+def render_job(loop_path: str, output_path: str, repetitions: int, click: bool) -> dict:
+    """Renders one Loop file, run in a process of the pool"""
+    renderer = OfflineRenderer(repetitions=repetitions, click=click)
+    return renderer.render_file(loop_path, output_path)
+
+
+def render_files(loop_paths: list, output_directory: str, repetitions: int = 1,
+                 format: str = 'wav', click: bool = False,
+                 workers: int = OFFLINE_WORKERS) -> list:
+    """Renders many Loop files in parallel, one per process of a pool
+
+    A Loop that fails to render is reported and skipped. Returns the
+    results of the Loops that were rendered.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    jobs = [(loop_path, output_path(loop_path, output_directory, format))
+            for loop_path in loop_paths]
+    if workers == 1 or len(jobs) == 1:
+        futures = None
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        futures = [executor.submit(render_job, loop_path, path, repetitions, click)
+                   for loop_path, path in jobs]
+
+    results = []
+    for index, (loop_path, path) in enumerate(jobs):
+        try:
+            if futures is None:
+                result = render_job(loop_path, path, repetitions, click)
+            else:
+                result = futures[index].result()
+            print(f'{result["output"]}: {result["seconds"]:.1f}s of audio '
+                  f'in {result["elapsed"]:.2f}s ({result["speed"]:.0f}x real time)')
+            results.append(result)
+        except Exception as e:
+            print(f'Exception while rendering {loop_path}')
+            print(f'Message: {e}')
+    if futures is not None:
+        executor.shutdown()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Renders Loop files to audio files, faster than real time')
+    parser.add_argument('loops', nargs='+', help='JSON files of the Loops')
+    parser.add_argument('-o', '--output', default='renders',
+                        help='directory the audio files are written to')
+    parser.add_argument('-n', '--repetitions', type=int, default=1,
+                        help='times the loop is repeated in each file')
+    parser.add_argument('-f', '--format', default='wav', choices=['wav', 'flac'])
+    parser.add_argument('-j', '--workers', type=int, default=OFFLINE_WORKERS,
+                        help='processes rendering in parallel')
+    parser.add_argument('--click', action='store_true',
+                        help='mix the metronome into the files')
+    args = parser.parse_args()
+    render_files(args.loops, args.output, repetitions=args.repetitions,
+                 format=args.format, click=args.click, workers=args.workers)
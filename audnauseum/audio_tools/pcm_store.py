@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+from audnauseum.constants import SAMPLE_RATE, SIDECAR_DIRECTORY
+
+# Frames decoded at a time while converting, keeps the conversion of
+# multi-minute stems from decoding the whole file into memory
+CONVERT_BLOCK_SIZE = 65536
+
+
+def resample(data: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """Band-limited resampling of (frames, channels) audio in one FFT
+
+    The spectrum of every channel is truncated or zero-padded to the new
+    length. The FFT treats the audio as periodic, which suits loops: the
+    end blends into the start instead of ringing against silence.
+    """
+    frames = data.shape[0]
+    length = round(frames * target_rate / source_rate)
+    if frames == 0 or length == 0:
+        return np.zeros((length, data.shape[1]), dtype='float32')
+    spectrum = np.fft.rfft(data, axis=0)
+    bins = length // 2 + 1
+    if bins <= spectrum.shape[0]:
+        spectrum = spectrum[:bins]
+    else:
+        spectrum = np.pad(spectrum, ((0, bins - spectrum.shape[0]), (0, 0)))
+    resampled = np.fft.irfft(spectrum, n=length, axis=0) * (length / frames)
+    return resampled.astype('float32')
+
+
+class PcmStore:
+    """Raw PCM sidecar files that Tracks are memory-mapped from
+
+    Each WAV file is converted once into a raw interleaved float32 file,
+    with a small JSON header next to it describing the layout. Opening a
+    sidecar with np.memmap lets every block be a zero-copy view into a
+    mapping that the OS pages in on demand, instead of an array decoded
+    into the heap.
+
+    Files recorded at another sample rate are resampled to the engine's
+    rate while they are converted, so they play at the right speed and
+    the cost is only paid once per file.
+
+    A sidecar is converted again when the modification time or size of
+    its source file changes. Each sidecar has its own lock, so converting
+    one file never holds up a request for another.
+    """
+    directory: str
+    samplerate: int
+
+    def __init__(self, directory: str = SIDECAR_DIRECTORY, samplerate: int = SAMPLE_RATE):
+        self.directory = directory
+        self.samplerate = samplerate
+        # Guards the dictionary of locks, only held to look one up
+        self._lock = threading.Lock()
+        # Lock of each sidecar by its pcm path, held while converting
+        self._path_locks = {}
+        # Starts its thread on the first conversion
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='PcmStore')
+
+    def sidecar_paths(self, file_name: str):
+        """Returns the (pcm, header) paths of the sidecar for a file
+
+        Sidecars at different sample rates are kept apart.
+        """
+        source = f'{os.path.abspath(file_name)}@{self.samplerate}'
+        name = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, name)
+        return base + '.f32', base + '.json'
+
+    def read_header(self, file_name: str) -> dict:
+        """Returns the header of a sidecar, or None if there is none"""
+        _, header_path = self.sidecar_paths(file_name)
+        try:
+            with open(header_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_valid(self, file_name: str) -> bool:
+        """Checks whether the sidecar matches the current source file"""
+        header = self.read_header(file_name)
+        if header is None:
+            return False
+        stat = os.stat(file_name)
+        return header['mtime_ns'] == stat.st_mtime_ns \
+            and header['size'] == stat.st_size \
+            and header['samplerate'] == self.samplerate
+
+    def ensure(self, file_name: str) -> bool:
+        """Converts a file to its sidecar unless an up-to-date one exists
+
+        Called when a Track is added so that playback never has to wait
+        on the conversion. Returns True if a conversion took place.
+        """
+        with self.path_lock(file_name):
+            if self.is_valid(file_name):
+                return False
+            self.convert(file_name)
+            return True
+
+    def ensure_in_background(self, file_name: str) -> Future:
+        """Runs ensure on a worker thread, returns its Future
+
+        Conversions run one at a time. Opening the file meanwhile waits
+        for its conversion to finish, submitting never waits.
+        """
+        return self._executor.submit(self.ensure, file_name)
+
+    def path_lock(self, file_name: str) -> threading.Lock:
+        """Returns the lock of a file's sidecar"""
+        pcm_path, _ = self.sidecar_paths(file_name)
+        with self._lock:
+            return self._path_locks.setdefault(pcm_path, threading.Lock())
+
+    def convert(self, file_name: str) -> dict:
+        """Writes the raw interleaved sidecar and header of a file
+
+        Both are written to temporary files first and renamed into place,
+        so a reader never sees a half-written sidecar. The temporary files
+        are named after the process, because offline renders convert files
+        in parallel. A file at the engine's sample rate is copied block by
+        block, any other is resampled whole.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        pcm_path, header_path = self.sidecar_paths(file_name)
+        stat = os.stat(file_name)
+        suffix = f'.{os.getpid()}.tmp'
+
+        frames = 0
+        with sf.SoundFile(file_name) as source, open(pcm_path + suffix, 'wb') as f:
+            header = {
+                'source': os.path.abspath(file_name),
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'source_samplerate': source.samplerate,
+                'samplerate': self.samplerate,
+                'channels': source.channels,
+                'dtype': 'float32',
+            }
+            if source.samplerate == self.samplerate:
+                for block in source.blocks(CONVERT_BLOCK_SIZE, dtype='float32',
+                                           always_2d=True):
+                    f.write(block.tobytes())
+                    frames += block.shape[0]
+            else:
+                data = resample(source.read(dtype='float32', always_2d=True),
+                                source.samplerate, self.samplerate)
+                f.write(data.tobytes())
+                frames = data.shape[0]
+        header['frames'] = frames
+
+        with open(header_path + suffix, 'w') as f:
+            json.dump(header, f, indent=4)
+        os.replace(pcm_path + suffix, pcm_path)
+        os.replace(header_path + suffix, header_path)
+        return header
+
+    def open(self, file_name: str) -> np.ndarray:
+        """Memory-maps the sidecar of a file as a (frames, channels) array
+
+        The sidecar is converted first if it is missing or out of date.
+        """
+        self.ensure(file_name)
+        header = self.read_header(file_name)
+        shape = (header['frames'], header['channels'])
+        if header['frames'] == 0:
+            # Empty files can't be mapped
+            return np.zeros(shape, dtype=header['dtype'])
+        pcm_path, _ = self.sidecar_paths(file_name)
+        return np.memmap(pcm_path, dtype=header['dtype'], mode='r', shape=shape)
+
+    def remove(self, file_name: str):
+        """Deletes the sidecar of a file"""
+        with self.path_lock(file_name):
+            for path in self.sidecar_paths(file_name):
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,230 @@
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from audnauseum.audio_tools.track_cache import TrackCache
+from audnauseum.constants import PITCH_CACHE_BYTES, PITCH_SHIFT_WORKERS
+
+# Frame and hop size of the phase vocoder's short-time Fourier transform
+STFT_SIZE = 2048
+STFT_HOP = 512
+
+# Frames of a track hashed into the cache key of its renders
+RENDER_KEY_FRAMES = 4096
+
+
+def stft(x: np.ndarray, size: int = STFT_SIZE, hop: int = STFT_HOP) -> np.ndarray:
+    """Short-time Fourier transform of a mono signal, (frames, bins)"""
+    window = np.hanning(size + 1)[:-1]
+    padded = np.pad(x, (size // 2, size // 2 + hop))
+    # Every row indexes one frame, hop samples after the previous one
+    starts = np.arange((padded.shape[0] - size) // hop + 1) * hop
+    frames = padded[starts[:, np.newaxis] + np.arange(size)]
+    return np.fft.rfft(frames * window, axis=1)
+
+
+def istft(spectrum: np.ndarray, length: int, size: int = STFT_SIZE,
+          hop: int = STFT_HOP) -> np.ndarray:
+    """Overlap-adds a (frames, bins) spectrum back into `length` samples"""
+    window = np.hanning(size + 1)[:-1]
+    frames = np.fft.irfft(spectrum, n=size, axis=1) * window
+    total = max(size + hop * (frames.shape[0] - 1), size // 2 + length)
+    out = np.zeros(total)
+    norm = np.zeros(total)
+    for index, frame in enumerate(frames):
+        out[index * hop:index * hop + size] += frame
+        norm[index * hop:index * hop + size] += window ** 2
+    out[norm > 1e-3] /= norm[norm > 1e-3]
+    return out[size // 2:size // 2 + length]
+
+
+def time_stretch(x: np.ndarray, rate: float, size: int = STFT_SIZE,
+                 hop: int = STFT_HOP) -> np.ndarray:
+    """Changes the duration of a mono signal by 1 / rate, keeping its pitch
+
+    A phase vocoder: the spectrum is resampled in time and the phase of
+    every bin is advanced by its measured instantaneous frequency.
+    """
+    spectrum = stft(x, size, hop).T
+    bins = spectrum.shape[0]
+    steps = np.arange(0, spectrum.shape[1] - 1, rate)
+    index = steps.astype(int)
+    alpha = steps - index
+    left, right = spectrum[:, index], spectrum[:, index + 1]
+    magnitude = (1 - alpha) * np.abs(left) + alpha * np.abs(right)
+
+    # Phase advance of each bin per hop, plus its measured deviation
+    advance = np.linspace(0, np.pi * hop, bins)[:, np.newaxis]
+    delta = np.angle(right) - np.angle(left) - advance
+    delta -= 2 * np.pi * np.round(delta / (2 * np.pi))
+    phase = np.cumsum(advance + delta, axis=1)
+    phase = np.angle(spectrum[:, :1]) + np.concatenate(
+        [np.zeros((bins, 1)), phase[:, :-1]], axis=1)
+
+    stretched = (magnitude * np.exp(1j * phase)).T
+    return istft(stretched, round(x.shape[0] / rate), size, hop)
+
+
+def shift_pitch(data: np.ndarray, semitones: float) -> np.ndarray:
+    """Shifts the pitch of (frames, channels) audio, keeping its length
+
+    Each channel is stretched by the pitch ratio, then resampled back to
+    its original length, which raises or lowers its pitch by that ratio.
+    """
+    frames = data.shape[0]
+    shifted = np.zeros(data.shape, dtype='float32')
+    if frames == 0 or not semitones:
+        shifted[:] = data
+        return shifted
+
+    ratio = 2 ** (semitones / 12)
+    positions = np.arange(frames) * ratio
+    for channel in range(data.shape[1]):
+        stretched = time_stretch(data[:, channel].astype('float64'), 1 / ratio)
+        shifted[:, channel] = np.interp(
+            positions, np.arange(stretched.shape[0]), stretched)
+    return shifted
+
+
+class PitchShifter:
+    """Renders pitch-shifted copies of tracks in a pool of processes
+
+    Pitch shifting a whole track is far too slow to do block by block, so
+    when a track's pitch_adjust changes, a shifted copy is rendered in the
+    background. The renders are kept in their own TrackCache, keyed by the
+    track's file, its content and the semitone offset, so switching back to
+    a setting that was already rendered is served from memory.
+
+    The WavReader only ever looks a render up, it never waits for one:
+    a track keeps playing its original audio until its render is ready
+    and is swapped to it the next time the loop restarts.
+    """
+    track_cache: TrackCache
+    renders: TrackCache
+    workers: int
+
+    def __init__(self, track_cache: TrackCache, budget: int = PITCH_CACHE_BYTES,
+                 workers: int = PITCH_SHIFT_WORKERS):
+        self.track_cache = track_cache
+        self.renders = TrackCache(budget=budget)
+        self.workers = workers
+        self._executor = None
+        # Renders in progress by name
+        self._pending = {}
+        # Names of the renders of each file, to discard them together
+        self._names = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def render_name(file_name: str, data: np.ndarray, semitones: float) -> str:
+        """Cache key of a render, changes with the track's content
+
+        The content is told apart by the audio's shape and a hash of
+        RENDER_KEY_FRAMES frames spread across it, so a track recorded
+        again to the same path and length gets a render of its own
+        without hashing all of its audio.
+        """
+        frames, channels = data.shape
+        step = max(1, frames // RENDER_KEY_FRAMES)
+        sample = np.ascontiguousarray(data[::step], dtype='float32')
+        digest = hashlib.sha1(sample.tobytes()).hexdigest()[:16]
+        return f'{TrackCache.key(file_name)}@{frames}x{channels}@{digest}@{semitones:+g}'
+
+    def request(self, file_name: str, semitones: float) -> Future:
+        """Starts rendering a track at a semitone offset in the background
+
+        Returns the Future of the render, or None if there is nothing to
+        render because the offset is 0 or the render is already cached.
+        Called when the setting changes, never from the audio thread.
+        """
+        if not semitones:
+            return None
+        data = self.track_cache.get(file_name)
+        name = self.render_name(file_name, data, semitones)
+        with self._lock:
+            if name in self._pending:
+                return self._pending[name]
+            if self.renders.find(name) is not None:
+                return None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+            future = self._executor.submit(
+                shift_pitch, np.asarray(data), semitones)
+            self._pending[name] = future
+            self._names.setdefault(TrackCache.key(file_name), set()).add(name)
+        future.add_done_callback(partial(self._finish, name))
+        return future
+
+    def render(self, file_name: str, semitones: float) -> np.ndarray:
+        """Renders a track at a semitone offset in the calling thread
+
+        For offline rendering, where waiting for the render is fine. The
+        render is cached like one rendered in the background.
+        """
+        data = self.track_cache.get(file_name)
+        if not semitones:
+            return data
+        name = self.render_name(file_name, data, semitones)
+        shifted = self.renders.find(name)
+        if shifted is None:
+            shifted = self.renders.put(name, shift_pitch(np.asarray(data), semitones))
+            with self._lock:
+                self._names.setdefault(TrackCache.key(file_name), set()).add(name)
+        return shifted
+
+    def rendered(self, file_name: str, data: np.ndarray, semitones: float) -> np.ndarray:
+        """Returns the track's audio at a semitone offset if it is ready
+
+        `data` is the original audio, returned as is for an offset of 0.
+        Returns None if the render isn't ready, never blocks.
+        """
+        if not semitones:
+            return data
+        return self.renders.find(self.render_name(file_name, data, semitones))
+
+    def _finish(self, name: str, future: Future):
+        """Stores a finished render, called by the pool's thread
+
+        The render is stored before it stops being pending, under the
+        lock, so a request in between never submits it again.
+        """
+        with self._lock:
+            try:
+                if not future.cancelled():
+                    self.renders.put(name, future.result())
+            except Exception as e:
+                print(f'Exception while pitch shifting {name}')
+                print(f'Message: {e}')
+            finally:
+                self._pending.pop(name, None)
+
+    def discard(self, file_name: str):
+        """Drops every render of a file, e.g. when it changed on disk"""
+        with self._lock:
+            names = self._names.pop(TrackCache.key(file_name), set())
+        for name in names:
+            self.renders.discard(name)
+
+    def shut_down(self):
+        """Stops the pool, renders in progress are abandoned"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            pending = list(self._pending.values())
+        # Python 3.8's shutdown() can't cancel the queued renders itself
+        for future in pending:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        """Returns the render cache statistics and the renders in progress"""
+        stats = self.renders.stats()
+        with self._lock:
+            stats['pending'] = len(self._pending)
+        return stats
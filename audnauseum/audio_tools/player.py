@@ -1,115 +1,158 @@
-from audnauseum.constants import BLOCK_SIZE, PLAYER_QUEUE_SIZE, SAMPLE_RATE
+from audnauseum.audio_tools.audio_backend import CallbackFlags
+from audnauseum.audio_tools.ring_buffer import RingBuffer
+from audnauseum.audio_tools.telemetry import Telemetry
+from audnauseum.constants import BLOCK_SIZE, CHANNELS, PLAYER_BUFFER_FRAMES, SAMPLE_RATE
 from audnauseum.data_models.loop import Loop
 
-import sys
-import queue
+import threading
+from time import perf_counter
 
-import sounddevice as sd
 import numpy as np
 assert np
 
 
 class Player:
-    """Handles streaming of audio blocks from a queue to output devices
+    """Handles streaming of audio frames from a ring buffer to output devices
 
+    The Aggregator writes mixed frames into the ring buffer, the callback
+    copies them to the device without ever taking a lock. Loop restarts
+    are carried in the ring buffer next to the frames.
 
+    If a source is set, the Player pulls its audio instead: the callback
+    asks the source to render each block straight into the device's
+    buffer, and no buffer sits between mixing and playback.
+
+    The output stream is opened once per session by the DeviceManager,
+    which calls the callback for every block. Play and stop only open
+    and close a gate in the callback, which plays silence while stopped.
+    The time the callback takes to see a change is the transport latency.
+
+    Output underflows reported by the device and the longest time the
+    callback took are counted for the AutoTuner.
     """
-    stream: sd.OutputStream
     playing: bool
     previously_playing: bool
-    input_queue: queue.Queue
-    last_block_notifier_queue: queue.Queue
+    ring: RingBuffer
+    source: object
     blocksize: int
-    queue_size: int
     samplerate: int
     loop: Loop
-
-    def __init__(self, loop: Loop = None, blocksize=BLOCK_SIZE, queue_size=PLAYER_QUEUE_SIZE, samplerate=SAMPLE_RATE):
-        self.stream = None
+    transport_requested: float
+    play_latency: float
+    stop_latency: float
+    stopped: threading.Event
+    output_underflows: int
+    callback_time_max: float
+    telemetry: Telemetry
+
+    def __init__(self, loop: Loop = None, blocksize=BLOCK_SIZE, buffer_frames=PLAYER_BUFFER_FRAMES,
+                 samplerate=SAMPLE_RATE):
         self.playing = False
         self.previously_playing = False
         self.blocksize = blocksize
         self.samplerate = samplerate
-        self.input_queue = queue.Queue(maxsize=queue_size)
-        self.last_block_notifier_queue = queue.Queue(maxsize=queue_size)
+        self.ring = RingBuffer(capacity=buffer_frames, channels=CHANNELS)
         self.loop = loop
         if self.loop is None:
             self.loop = Loop()
+        # An object with a render(outdata) method for 'pull' mode
+        self.source = None
+        self.transport_requested = None
+        self.play_latency = None
+        self.stop_latency = None
+        # Set by the callback once it has stopped reading the ring buffer
+        self.stopped = threading.Event()
+        self.stopped.set()
+        self.reset_stats()
+        # Times each callback, shared by the Looper
+        self.telemetry = Telemetry()
 
     def play(self):
         """Starts the streaming playback from input data to audio output.
-        """
-        self.playing = True
-        self.create_stream()
 
-    def create_stream(self):
-        """Creates the output stream for audio processing
+        Opens the callback's gate, the stream is already running.
         """
-        if self.stream is not None:
-            self.stream.close()
-        self.stream = sd.OutputStream(
-            blocksize=self.blocksize, dtype='float32',
-            samplerate=self.samplerate, callback=self.callback)
-        self.stream.start()
+        self.transport_requested = perf_counter()
+        self.stopped.clear()
+        self.playing = True
 
     def stop(self):
         """Stops the playback of audio
 
-        Closes the output stream and empties the audio queue
+        Closes the callback's gate and drops the buffered frames once the
+        callback has stopped reading them. Doesn't wait for longer than a
+        few blocks, in case the stream isn't running.
         """
+        self.transport_requested = perf_counter()
         self.playing = False
-        self.stream.close()
-        if self.input_queue.qsize() != 0:
-            self.input_queue.task_done()
-        self.empty_queue(self.input_queue)
-        if self.last_block_notifier_queue.qsize() != 0:
-            self.last_block_notifier_queue.task_done()
-        self.empty_queue(self.last_block_notifier_queue)
-
-    def empty_queue(self, queue_to_empty: queue.Queue):
-        """Empty the queue of audio blocks
-
-        Python doesn't seem to actually provide a method to empty a queue
-        """
-        while queue_to_empty.qsize() != 0:
-            try:
-                queue_to_empty.get_nowait()
-                queue_to_empty.task_done()
-            except queue.Empty:
-                pass
-            except ValueError:
-                pass
-
-    def callback(self, outdata, frames: int, time, status: sd.CallbackFlags):
+        self.stopped.wait(timeout=4 * self.blocksize / self.samplerate)
+        self.ring.clear()
+
+    def callback(self, outdata, frames: int, time, status: CallbackFlags):
         """This callback is called from a separate thread by the underlying
         library for each block of audio data.
 
         The `outdata` must be set to the audio data to play next."""
-        if not self.playing:
-            raise sd.CallbackAbort
+        playing = self.playing
+        if playing != self.previously_playing:
+            self.transport_changed(playing)
+        if not playing:
+            outdata[:] = 0
+            return
         assert frames == self.blocksize
+        started = perf_counter()
         if status.output_underflow:
-            print('Output underflow: increase blocksize?', file=sys.stderr)
-            raise sd.CallbackAbort
-        assert not status
-        try:
-            data: np.ndarray = self.input_queue.get_nowait()
-            is_last_block: bool = self.last_block_notifier_queue.get_nowait()
-        except queue.Empty as e:
-            print('Queue is empty: increase queue_size?', file=sys.stderr)
-            raise sd.CallbackAbort from e
-
-        # Check if the audio block isn't full
-        if len(data) < len(outdata):
-            # zero-byte the remainder of the output in case there's noise
-            outdata = np.empty(
-                (self.blocksize, sd.default.channels[1]), dtype='float32')
-            outdata[:len(data)] = data
+            self.output_underflows += 1
+        self.output(outdata, frames)
+        elapsed = perf_counter() - started
+        if elapsed > self.callback_time_max:
+            self.callback_time_max = elapsed
+        self.telemetry.record('callback', elapsed)
+
+    def transport_changed(self, playing: bool):
+        """Records how long the callback took to see play or stop"""
+        self.previously_playing = playing
+        if self.transport_requested is not None:
+            latency = perf_counter() - self.transport_requested
+            if playing:
+                self.play_latency = latency
+            else:
+                self.stop_latency = latency
+        if not playing:
+            self.stopped.set()
+
+    def reset_stats(self):
+        """Resets the underflow and callback timing statistics"""
+        self.ring.underflows = 0
+        self.output_underflows = 0
+        self.callback_time_max = 0.
+
+    def stats(self) -> dict:
+        """Returns the underflow and callback timing statistics
+
+        The load is the longest callback as a fraction of a block's
+        duration, the time the device gives the callback to finish.
+        """
+        return {
+            'blocksize': self.blocksize,
+            'buffer_frames': self.ring.capacity,
+            'underflows': self.ring.underflows,
+            'output_underflows': self.output_underflows,
+            'callback_time_max': self.callback_time_max,
+            'load': self.callback_time_max * self.samplerate / self.blocksize,
+        }
+
+    def output(self, outdata, frames: int):
+        """Fills `outdata` with the next block and advances the cursor"""
+        if self.source is not None:
+            restart = self.source.render(outdata)
         else:
-            outdata[:] = data
+            # Missing frames are zero-filled and counted by the ring buffer
+            restart = self.ring.read_into(outdata)
 
-        # Update the audio played cursor
-        if is_last_block:
-            self.loop.audio_cursor = 0
-        else:
+        # Update the audio played cursor, the restart is the frame
+        # offset in this block at which the loop started again
+        if restart is None:
             self.loop.audio_cursor += frames
+        else:
+            self.loop.audio_cursor = frames - restart
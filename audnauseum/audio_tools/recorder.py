@@ -1,14 +1,17 @@
 # TODO-create file with python's open() and include buffering argument
 # TODO-check for file-creation fail (Line 92)
 
-from audnauseum.constants import BLOCK_SIZE
+from audnauseum.constants import BLOCK_SIZE, SAMPLE_RATE, \
+    RECORDER_BUFFER_FRAMES, RECORDER_STOP_TIMEOUT, RECORDER_TAKE_FRAMES, \
+    RECORDER_WRITE_FRAMES
 from datetime import datetime
-from time import sleep
+from time import perf_counter, sleep
 import soundfile as sf
-import sounddevice as sd
 import os
-import queue
 import threading
+from audnauseum.audio_tools.audio_backend import CallbackFlags, get_backend
+from audnauseum.audio_tools.ring_buffer import RingBuffer
+from audnauseum.audio_tools.telemetry import Telemetry
 from audnauseum.data_models.loop import Loop
 from audnauseum.data_models.track import Track
 
@@ -19,28 +22,68 @@ assert np
 class Recorder:
     """Handles recording from input devices to file
 
-    Opens input streams to record incoming audio to a file
-    and generates a Track from that data to add to the current
-    Loop.
+    Records incoming audio to a file and generates a Track from that
+    data to add to the current Loop. The input stream is opened once per
+    session by the DeviceManager, which calls audio_callback for every
+    block. Recording only opens a gate in the callback.
+
+    The input callback copies each block into a preallocated ring buffer
+    and a writer thread drains it into the file in large batches, so a
+    slow disk never holds up the callback. Blocks that arrive while the
+    ring is full are dropped and counted as overflows.
+
+    On a duplex stream each input block comes with the loop position of
+    the output block played by the same callback, which becomes the
+    exact starting sample of the take.
+
+    The writer also keeps takes of up to RECORDER_TAKE_FRAMES in memory.
+    When recording stops, such a take is handed over as soon as the last
+    frames are captured, the file is finalized in the background. A
+    longer take plays from its file once it is finalized. If the writer
+    fails before the take is handed over, e.g. the file can't be
+    created, its exception is kept in `error` and no Track is made.
     """
     directory: str
-    stream: sd.InputStream
+    channels: int
+    samplerate: int
     recording: bool
     previously_recording: bool
-    audio_queue: queue.Queue
+    capture_finished: bool
+    ring: RingBuffer
+    take: np.ndarray
+    take_frames: int
+    take_ready: threading.Event
+    finalized: threading.Event
+    error: Exception
+    record_requested: float
+    record_latency: float
+    stop_latency: float
     current_file: str
     loop: Loop
     input_overflows: int
     thread: threading.Thread
     starting_sample: int
+    telemetry: Telemetry
 
-    def __init__(self, loop=None):
+    def __init__(self, loop=None, channels: int = None, samplerate: int = SAMPLE_RATE):
+        """The channels default to those of the default input device"""
         self.directory = 'resources/recordings'
         self.starting_sample = 0
-        self.stream = None
-        self.create_stream()
+        self.channels = channels
+        if self.channels is None:
+            self.channels = get_backend().default.channels[0]
+        self.samplerate = samplerate
         self.recording = self.previously_recording = False
-        self.audio_queue = queue.Queue()
+        self.capture_finished = False
+        self.ring = RingBuffer(RECORDER_BUFFER_FRAMES, channels=self.channels)
+        self.take = None
+        self.take_frames = 0
+        self.take_ready = threading.Event()
+        self.finalized = threading.Event()
+        self.error = None
+        self.record_requested = None
+        self.record_latency = None
+        self.stop_latency = None
         self.current_file = None
         self.last_file = None
         self.loop = loop
@@ -48,34 +91,28 @@ class Recorder:
             self.loop = Loop()
         self.input_overflows = 0
         self.thread = None
+        # Times each write to disk, shared by the Looper
+        self.telemetry = Telemetry()
 
-    def create_stream(self, samplerate=44100):
-        """Creates the sounddevice InputStream for recording
+    def audio_callback(self, indata: np.ndarray, frames, time, status: CallbackFlags,
+                       position: int = None):
+        """This is called (from a separate thread) for each audio block.
 
-        The channels and device are inherited from the respective
-        defaults in sd.default
+        `position` is the loop position of the block, given by a duplex
+        stream. The take starts at the position of its first block.
         """
-        if self.stream is not None:
-            self.stream.close()
-        self.stream = sd.InputStream(samplerate=samplerate,
-                                     callback=self.audio_callback)
-        self.stream.start()
-
-    def after(self, ms, func=None, *args):
-        sleep(ms/1000)
-        if func:
-            return func(*args)
-
-    def audio_callback(self, indata: np.ndarray, frames, time, status: sd.CallbackFlags):
-        """This is called (from a separate thread) for each audio block."""
         if status.input_overflow:
             self.input_overflows += 1
         if self.recording:
-            self.audio_queue.put(indata.copy())
+            if not self.previously_recording:
+                self.record_latency = perf_counter() - self.record_requested
+                if position is not None:
+                    self.starting_sample = position
+            self.ring.write(indata)
             self.previously_recording = True
         else:
             if self.previously_recording:
-                self.audio_queue.put(None)
+                self.capture_finished = True
                 self.previously_recording = False
 
     def on_rec(self):
@@ -84,7 +121,6 @@ class Recorder:
         if self.starting_sample < 0:
             self.starting_sample = 0
 
-        self.recording = True
         # create directory if not present
         if not os.path.exists(self.directory):
             os.makedirs(self.directory)
@@ -93,51 +129,170 @@ class Recorder:
             now.strftime('%Y%m%d%H%M%S') + '.wav'
         self.current_file = filename
 
-        if self.audio_queue.qsize() != 0:
-            print('WARNING: Queue not empty!')
+        # Each take's writer only ever sets its own events, and a writer
+        # that on_stop gave up on leaves the next take alone
+        self.take_ready = threading.Event()
+        self.finalized = threading.Event()
+        if self.ring.fill != 0:
+            print('WARNING: Ring buffer not empty!')
+        # Reset the capture before the callback can write to it
+        self.ring.clear()
+        self.capture_finished = False
+        self.take = None
+        self.take_frames = 0
+        self.error = None
         self.thread = threading.Thread(
             target=self.file_writing_thread,
             kwargs=dict(
+                take_ready=self.take_ready,
+                finalized=self.finalized,
                 file=filename,
                 mode='w',
-                samplerate=int(self.stream.samplerate),
-                channels=self.stream.channels,
-                queue=self.audio_queue,
+                samplerate=self.samplerate,
+                channels=self.channels,
             ),
         )
         self.thread.start()
+        self.record_requested = perf_counter()
+        self.recording = True
 
     def on_stop(self, *args) -> Track:
+        """Stops recording and returns a Track for the take
+
+        Returns as soon as the last frames are captured, with the take's
+        audio in `take`. Its file is still being finalized until the
+        `finalized` event is set. A take too long to keep in memory has
+        no `take`, this waits until its file is finalized.
+
+        Returns None if the take couldn't be written, or the writer didn't
+        finish it within RECORDER_STOP_TIMEOUT, see `error`.
+        """
+        stopped = perf_counter()
         self.recording = False
-        self.wait_for_thread()
-        track = Track(self.current_file, slip=self.starting_sample)
+        # The callback marks the end of the capture on its next block
+        if not self.take_ready.wait(timeout=10 * BLOCK_SIZE / self.samplerate):
+            # The stream stopped calling back, end the capture here
+            self.capture_finished = True
+            if not self.take_ready.wait(timeout=RECORDER_STOP_TIMEOUT):
+                self.error = TimeoutError('the writer stalled')
+        if self.error is None and self.take is None:
+            if not self.finalized.wait(timeout=RECORDER_STOP_TIMEOUT):
+                self.error = TimeoutError('the file was not finalized')
+        self.stop_latency = perf_counter() - stopped
+
+        if self.error is not None:
+            print(f'Exception while recording {self.current_file}')
+            print(f'Message: {self.error}')
+            self.current_file = None
+            self.starting_sample = 0
+            return None
+
+        track = Track(self.current_file, slip=self.starting_sample,
+                      samples=self.take_frames,
+                      samplerate=self.samplerate)
         self.last_file = self.current_file
         self.current_file = None
         self.starting_sample = 0
         return track
 
-    def wait_for_thread(self):
-        self.after(0.1, self._wait_for_thread)
-
-    def _wait_for_thread(self):
-        if self.thread.is_alive():
-            self.wait_for_thread()
-            return
-        self.thread.join()
-
     def close_window(self):
         if self.recording:
             self.on_stop()
         self.destroy()
 
-    def file_writing_thread(self, *, queue, **soundfile_args):
-        """Write data from queue to file until *None* is received."""
-        with sf.SoundFile(**soundfile_args) as file:
-            while True:
-                data = queue.get()
-                if data is None:
-                    break
-                file.write(data)
+    def file_writing_thread(self, take_ready: threading.Event,
+                            finalized: threading.Event, **soundfile_args):
+        """Writes the ring buffer to file until the capture has finished
+
+        Waits for a full batch before writing, so the file is written in
+        a few large writes. Batches are drained into the take, which
+        doubles in size whenever it is full, until it would outgrow
+        RECORDER_TAKE_FRAMES and is dropped. Once the capture has
+        finished, the rest of the ring is drained and the take is handed
+        over before its last frames are written and the file is closed.
+
+        Both events are set however the writer ends, so on_stop never
+        waits on a writer that died. An exception raised before the take
+        is handed over is kept in `error`, one raised while finalizing
+        the file is only printed, the take already plays from memory.
+        """
+        def current() -> bool:
+            return take_ready is self.take_ready
+
+        take = np.empty((RECORDER_BUFFER_FRAMES, self.ring.channels),
+                        dtype='float32')
+        frames = 0
+        try:
+            with sf.SoundFile(**soundfile_args) as file:
+                while not self.capture_finished and current():
+                    if self.ring.fill >= RECORDER_WRITE_FRAMES:
+                        take, chunk = self.drain(take, frames, RECORDER_WRITE_FRAMES)
+                        frames += chunk.shape[0]
+                        started = self.telemetry.start()
+                        file.write(chunk)
+                        self.telemetry.stop('write', started)
+                    else:
+                        sleep(RECORDER_WRITE_FRAMES / self.samplerate / 4)
+                if not current():
+                    return
+
+                # The callback has stopped writing, the take is complete.
+                # What's left is at most one ring of frames
+                rest = []
+                while self.ring.fill:
+                    take, chunk = self.drain(
+                        take, frames, min(self.ring.fill, RECORDER_WRITE_FRAMES))
+                    frames += chunk.shape[0]
+                    rest.append(chunk)
+                if take is not None:
+                    self.take = take[:frames]
+                self.take_frames = frames
+                take_ready.set()
+
+                for chunk in rest:
+                    file.write(chunk)
+        except Exception as e:
+            if not take_ready.is_set() and current():
+                self.error = e
+            else:
+                print(f'Exception while finalizing {soundfile_args.get("file")}')
+                print(f'Message: {e}')
+        finally:
+            take_ready.set()
+            finalized.set()
+
+    def drain(self, take: np.ndarray, frames: int, count: int) -> tuple:
+        """Reads `count` frames out of the ring into the take after `frames`
+
+        Returns the take, grown or dropped to make room, and the chunk
+        read. Once the take is dropped each chunk is a new array.
+        """
+        if take is not None and frames + count > RECORDER_TAKE_FRAMES:
+            take = None
+        elif take is not None and frames + count > take.shape[0]:
+            grown = np.empty((min(2 * take.shape[0], RECORDER_TAKE_FRAMES),
+                              self.ring.channels), dtype='float32')
+            grown[:frames] = take[:frames]
+            take = grown
+        if take is None:
+            chunk = np.empty((count, self.ring.channels), dtype='float32')
+        else:
+            chunk = take[frames:frames + count]
+        self.ring.read_into(chunk)
+        return take, chunk
+
+    def stats(self) -> dict:
+        """Returns the capture ring's fill level and overflow statistics
+
+        Also reports how long the callback took to start recording, and
+        how long the last take took to become playable after recording
+        stopped.
+        """
+        stats = self.ring.stats()
+        stats['input_overflows'] = self.input_overflows
+        stats['record_latency'] = self.record_latency
+        stats['stop_latency'] = self.stop_latency
+        return stats
 
     def get_current_file(self):
         return self.current_file
@@ -0,0 +1,136 @@
+import numpy as np
+
+from audnauseum.constants import CHANNELS
+
+
+class RingBuffer:
+    """Lock-free single-producer/single-consumer ring buffer of audio frames
+
+    The producer (the Aggregator's thread) only ever advances the write
+    count and the consumer (the Player's callback) only ever advances the
+    read count. Each count is a plain int assigned by a single thread, so
+    neither side ever takes a lock or waits on the other. The frames
+    between the two counts are the fill level.
+
+    Loop restarts travel in-band: a marker is stored alongside the frame
+    at which the loop starts again, so the consumer knows exactly where
+    the loop wrapped in the frames it reads.
+    """
+    capacity: int
+    channels: int
+    frames: np.ndarray
+    markers: np.ndarray
+    write_count: int
+    read_count: int
+    underflows: int
+    overflows: int
+    fill_high: int
+    fill_low: int
+
+    def __init__(self, capacity: int, channels: int = CHANNELS):
+        self.capacity = capacity
+        self.channels = channels
+        self.frames = np.zeros((capacity, channels), dtype='float32')
+        self.markers = np.zeros(capacity, dtype='uint8')
+        self.clear()
+
+    def clear(self):
+        """Drops every frame and resets the statistics
+
+        Only safe while neither the producer nor the consumer is running.
+        """
+        self.write_count = 0
+        self.read_count = 0
+        self.underflows = 0
+        self.overflows = 0
+        self.fill_high = 0
+        self.fill_low = self.capacity
+
+    @property
+    def fill(self) -> int:
+        """Frames written by the producer, not yet read by the consumer"""
+        return self.write_count - self.read_count
+
+    @property
+    def space(self) -> int:
+        """Frames the producer can write without overwriting unread ones"""
+        return self.capacity - self.fill
+
+    def write(self, data: np.ndarray, restart: int = None) -> bool:
+        """Copies frames into the ring (producer side)
+
+        `restart` is the index in `data` of the frame at which the loop
+        starts again, if it does. Returns False, writing nothing, if there
+        isn't enough space for all frames, and counts an overflow.
+        """
+        frames = data.shape[0]
+        if frames > self.space:
+            self.overflows += 1
+            return False
+
+        start = self.write_count % self.capacity
+        first = min(frames, self.capacity - start)
+        self.frames[start:start + first] = data[:first]
+        self.frames[:frames - first] = data[first:]
+        self.markers[start:start + first] = 0
+        self.markers[:frames - first] = 0
+        if restart is not None:
+            self.markers[(start + restart) % self.capacity] = 1
+
+        # Publish the frames only once they have been copied
+        self.write_count += frames
+        fill = self.fill
+        if fill > self.fill_high:
+            self.fill_high = fill
+        return True
+
+    def read_into(self, outdata: np.ndarray) -> int:
+        """Copies frames out of the ring into `outdata` (consumer side)
+
+        Frames missing because the producer fell behind are zero-filled and
+        counted as an underflow. Returns the index in `outdata` of the last
+        frame at which the loop restarted, or None if it didn't restart.
+        """
+        fill = self.fill
+        if fill < self.fill_low:
+            self.fill_low = fill
+        frames = min(outdata.shape[0], fill)
+        if frames < outdata.shape[0]:
+            outdata[frames:] = 0
+            self.underflows += 1
+
+        start = self.read_count % self.capacity
+        first = min(frames, self.capacity - start)
+        outdata[:first] = self.frames[start:start + first]
+        outdata[first:frames] = self.frames[:frames - first]
+        restart = self.last_marker(start + first, frames - first, first)
+        if restart is None:
+            restart = self.last_marker(start, first, 0)
+
+        # Free the frames only once they have been copied
+        self.read_count += frames
+        return restart
+
+    def last_marker(self, start: int, frames: int, offset: int) -> int:
+        """Finds the last restart marker in a contiguous range of the ring
+
+        Returns its index relative to the read plus `offset`, or None.
+        """
+        if frames <= 0:
+            return None
+        start %= self.capacity
+        markers = self.markers[start:start + frames]
+        if not markers.any():
+            return None
+        return offset + frames - 1 - int(markers[::-1].argmax())
+
+    def stats(self) -> dict:
+        """Returns the fill level and underflow/overflow statistics"""
+        return {
+            'capacity': self.capacity,
+            'fill': self.fill,
+            'fill_high': self.fill_high,
+            'fill_low': self.fill_low,
+            'underflows': self.underflows,
+            'overflows': self.overflows,
+        }
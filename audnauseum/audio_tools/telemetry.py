@@ -0,0 +1,112 @@
+from time import perf_counter
+
+from audnauseum.constants import TELEMETRY_ENABLED
+
+
+class Histogram:
+    """Counts durations in power-of-two buckets of microseconds
+
+    Bucket n holds the durations of less than 2 ** n microseconds that
+    didn't fit bucket n - 1. Recording is a few integer operations on
+    preallocated counters, cheap enough for every block of the callback.
+    """
+    BUCKETS = 24
+    counts: list
+    count: int
+    total: float
+    max: float
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * Histogram.BUCKETS
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+
+    def record(self, seconds: float):
+        bucket = min(int(seconds * 1e6).bit_length(), Histogram.BUCKETS - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound, in seconds, of the bucket holding a percentile"""
+        if self.count == 0:
+            return 0.
+        remaining = fraction * self.count
+        for bucket, count in enumerate(self.counts):
+            remaining -= count
+            if remaining <= 0:
+                return (2 ** bucket) / 1e6
+        return self.max
+
+    def summary(self) -> dict:
+        """Count, mean, percentiles and maximum in seconds"""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+            'buckets_us': {2 ** bucket: count
+                           for bucket, count in enumerate(self.counts) if count},
+        }
+
+
+class Telemetry:
+    """Timing histograms of the engine's real-time work
+
+    The Aggregator times reading and mixing each block, the Player its
+    callback and the Recorder its writes to disk. When disabled, start()
+    returns None and stop() returns at once, so the instrumented code
+    pays for two calls per block at most.
+
+    Fill levels and xrun counters are kept by the objects that own them
+    and only gathered when a snapshot is taken.
+    """
+    # Durations timed by the engine
+    NAMES = ('read', 'mix', 'callback', 'write')
+    enabled: bool
+    histograms: dict
+
+    def __init__(self, enabled: bool = TELEMETRY_ENABLED):
+        self.enabled = enabled
+        self.histograms = {name: Histogram() for name in Telemetry.NAMES}
+
+    def start(self) -> float:
+        """Returns the start time of a timing, or None while disabled"""
+        if self.enabled:
+            return perf_counter()
+        return None
+
+    def stop(self, name: str, started: float):
+        """Records the time since `started` in a histogram"""
+        if started is not None:
+            self.histograms[name].record(perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        """Records a duration that was already measured"""
+        if self.enabled:
+            self.histograms[name].record(seconds)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def snapshot(self, **sources) -> dict:
+        """Returns the durations, plus the statistics of every source
+
+        Each keyword is an object with a stats() method, e.g. the Player.
+        """
+        snapshot = {
+            'enabled': self.enabled,
+            'durations': {name: histogram.summary()
+                          for name, histogram in self.histograms.items()},
+        }
+        for name, source in sources.items():
+            snapshot[name] = source.stats()
+        return snapshot
@@ -0,0 +1,166 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from audnauseum.audio_tools.channel_layout import normalize_layout
+from audnauseum.audio_tools.pcm_store import PcmStore
+from audnauseum.constants import TRACK_CACHE_BYTES
+
+
+class TrackCache:
+    """Decoded audio data shared by everything that reads a Track
+
+    Each WAV file is decoded once into a contiguous float32 array of
+    shape (frames, channels), so the WavReader can serve its blocks as
+    slices of that array instead of asking libsndfile for every block of
+    every loop repetition.
+
+    When the decoded audio exceeds the byte budget, the least recently
+    used tracks are evicted. A reader still holding an evicted array keeps
+    playing it, the memory is released once the reader lets go of it.
+
+    Given a PcmStore, tracks are memory-mapped from their sidecar files
+    instead of being decoded into the heap. Mapped tracks are paged in by
+    the OS and don't count against the budget.
+
+    Every track is stored in the mixer's channel layout: mono tracks as
+    a broadcast view of their single channel, others downmixed once.
+    """
+    budget: int
+    store: PcmStore
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, budget: int = TRACK_CACHE_BYTES, store: PcmStore = None):
+        self.budget = budget
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, file_name: str) -> np.ndarray:
+        """Returns the decoded audio of a file, decoding it on a miss
+
+        The returned array is read-only, copy it before mutating.
+        """
+        key = self.key(file_name)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        # Decode outside the lock so other tracks can still be served
+        if self.store is not None:
+            return self.put(file_name, self.store.open(file_name))
+        return self.put(file_name, self.decode(file_name))
+
+    def find(self, file_name: str) -> np.ndarray:
+        """Returns the cached audio of a file, or None without decoding"""
+        key = self.key(file_name)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, file_name: str, data: np.ndarray) -> np.ndarray:
+        """Stores already decoded audio for a file
+
+        Returns the array that was stored, which is made read-only and
+        has the mixer's channel layout.
+        """
+        data = normalize_layout(data)
+        data.flags.writeable = False
+        key = self.key(file_name)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= self.heap_size(previous)
+            self._entries[key] = data
+            self._nbytes += self.heap_size(data)
+            self._evict()
+        return data
+
+    def discard(self, file_name: str):
+        """Removes a file from the cache, e.g. when it changed on disk"""
+        with self._lock:
+            data = self._entries.pop(self.key(file_name), None)
+            if data is not None:
+                self._nbytes -= self.heap_size(data)
+
+    def clear(self):
+        """Removes every file from the cache"""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> dict:
+        """Returns the hit/miss/eviction counters and the memory usage"""
+        with self._lock:
+            return {
+                'tracks': len(self._entries),
+                'bytes': self._nbytes,
+                'budget': self.budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, file_name):
+        return self.key(file_name) in self._entries
+
+    @staticmethod
+    def key(file_name: str) -> str:
+        """Tracks refer to files by relative path, normalize it"""
+        return os.path.abspath(file_name)
+
+    @staticmethod
+    def heap_size(data: np.ndarray) -> int:
+        """Bytes of heap memory held by an array, none if memory-mapped
+
+        A view, e.g. a broadcast mono track, holds the memory of the
+        array it views.
+        """
+        owner = data
+        while isinstance(owner.base, np.ndarray):
+            owner = owner.base
+        if isinstance(owner, np.memmap):
+            return 0
+        return owner.nbytes
+
+    @staticmethod
+    def decode(file_name: str) -> np.ndarray:
+        """Reads a whole audio file into a (frames, channels) float32 array"""
+        data, _ = sf.read(file_name, dtype='float32', always_2d=True)
+        return np.ascontiguousarray(data)
+
+    def _evict(self):
+        """Drops least recently used tracks until the budget is met
+
+        The most recently used track is always kept, even if it alone
+        is larger than the budget. Must be called with the lock held.
+        """
+        while self._nbytes > self.budget and len(self._entries) > 1:
+            _, data = self._entries.popitem(last=False)
+            self._nbytes -= self.heap_size(data)
+            self.evictions += 1
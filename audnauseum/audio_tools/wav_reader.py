@@ -1,164 +1,318 @@
-import soundfile as sf
-import sounddevice as sd
 import numpy as np
 
 from typing import List
-from queue import Queue
 
+from audnauseum.audio_tools.pitch_shifter import PitchShifter
+from audnauseum.audio_tools.track_cache import TrackCache
+from audnauseum.data_models.fx_settings import FxSettings
 from audnauseum.data_models.loop import Loop
-from audnauseum.constants import BLOCK_SIZE
+from audnauseum.constants import BLOCK_SIZE, CHANNELS
 
 
 class WavFile:
-    """Representation of an open file being read
+    """Representation of a file being read
 
-    Tracks variables necessary to determine when to read blocks from the file.
-    """
-    sound_file: sf.SoundFile
-    slip: int
-    finished_reading: bool
-    is_slipping: bool
+    Tracks variables necessary to determine what to read from the file.
+    The audio data is the decoded array from the TrackCache, blocks are
+    served as slices of it.
+
+    The slip is read from the FxSettings every block, so changing it
+    moves the track immediately. A file added during playback waits for
+    the loop to restart before it starts playing.
 
-    def __init__(self, sound_file: sf.SoundFile = None, slip: int = 0):
-        self.sound_file = sound_file
-        self.slip = slip
-        self.finished_reading = False
-        self.is_slipping = slip > 0
+    `staged` is the audio the file plays from the next loop restart, set
+    by the control thread, e.g. once a pitch-shifted render is ready.
+    """
+    file_name: str
+    data: np.ndarray
+    staged: np.ndarray
+    fx: FxSettings
+    waiting: bool
+
+    def __init__(self, file_name: str = None, data: np.ndarray = None, slip: int = 0,
+                 fx: FxSettings = None, waiting: bool = False):
+        self.file_name = file_name
+        self.data = data
+        self.staged = data
+        self.fx = fx
+        if self.fx is None:
+            self.fx = FxSettings(slip=slip)
+        self.waiting = waiting
+
+    @property
+    def slip(self) -> int:
+        """Sample position in the loop at which the file starts"""
+        return int(self.fx.slip)
 
     def __repr__(self):
-        return f'{self.sound_file.name}: {self.slip=}, {self.is_slipping=}, {self.finished_reading=}'
+        return f'{self.file_name}: {self.slip=}, {self.waiting=}'
 
 
 class WavReader:
     """Reads an arbitrary number of WAV files into iterable numpy array
 
+    Blocks are read at the loop's read cursor, the sample position in the
+    loop. The length of the loop is set by the 'master' track. When the
+    loop ends within a block, the tail of one pass is stitched to the head
+    of the next at the exact sample, so every block is full and the loop
+    is gapless.
+
+    In 'pull' mode blocks are read by the device's callback, so nothing
+    it calls takes a lock or decodes audio. Tracks added during playback
+    and swapped audio are prepared by the control thread and handed over
+    with plain attribute and list operations.
+
     Ride the wav's, bro"""
 
     loop: Loop
     blocksize: int
     files: List[WavFile]
-    tracks_to_add: Queue
+    added: List[WavFile]
+    admitted: int
     read_cursor: int
-    last_block_notifier_queue: Queue
+    track_cache: TrackCache
+    pitch_shifter: PitchShifter
+    revision: int
+    stack: np.ndarray
 
-    def __init__(self, loop: Loop, last_block_notifier_queue: Queue, blocksize=BLOCK_SIZE) -> None:
+    def __init__(self, loop: Loop, blocksize=BLOCK_SIZE, track_cache: TrackCache = None,
+                 pitch_shifter: PitchShifter = None) -> None:
         """Initialize the WavReader
 
         The WavReader requires a reference to the current Loop.
+        Decoded audio is shared through the TrackCache, a private one
+        is created if none is given. Without a PitchShifter, tracks
+        play at their original pitch.
 
         A new instance of WavReader is required each time a Loop is set.
         """
         self.loop = loop
         self.blocksize = blocksize
+        self.track_cache = track_cache
+        if self.track_cache is None:
+            self.track_cache = TrackCache()
+        self.pitch_shifter = pitch_shifter
         self.files = []
-        self.tracks_to_add = Queue()
-        self.last_block_notifier_queue = last_block_notifier_queue
+        # Files added during playback, appended by the control thread
+        # and admitted in order by the reading thread
+        self.added = []
+        self.admitted = 0
         self.read_cursor = 0
+        # Incremented whenever the list of files changes
+        self.revision = 0
+        # Blocks returned by read_to_list are views into this stack
+        self.stack = np.zeros((blocksize, 0, CHANNELS), dtype='float32')
 
     def open_files(self) -> None:
-        """Opens WAV files into SoundFile objects
+        """Fetches the decoded audio of every Track in the current loop
 
-        Opens file handles and reads headers into memory
-        based on the current loop. Sets the audio cursor to the slip value
+        Files are only decoded the first time they are read, after that
+        the audio comes straight from the TrackCache. Each file shares
+        the FxSettings of its own Track, the same file can be in the loop
+        more than once.
         """
-        self.files = [WavFile(sound_file=sf.SoundFile(track.file_name), slip=track.fx.slip)
+        self.files = [self.open_file(track.file_name, slip=track.fx.slip, fx=track.fx)
                       for track in self.loop.tracks]
+        self.added = []
+        self.admitted = 0
+        self.read_cursor = 0
+        self.revision += 1
 
-        for file in self.files:
-            file.sound_file.seek(0)
+    def open_file(self, file_path: str, slip: int = 0, waiting: bool = False,
+                  fx: FxSettings = None) -> WavFile:
+        """Creates a WavFile for the decoded audio of a file
 
-    def add_track(self, file_path: str, slip: int = 0):
+        The WavFile shares the FxSettings `fx` of its Track. Without them
+        it shares those of the loop's first Track for the file.
+        A pitch-shifted render is requested if the Track needs one.
+        """
+        if fx is None:
+            track = self.loop.get_track(file_path)
+            fx = track.fx if track is not None else None
+        file = WavFile(file_name=file_path, slip=slip, fx=fx, waiting=waiting)
+        file.data = file.staged = self.track_audio(file)
+        self.request_render(file)
+        return file
+
+    def request_render(self, file: WavFile):
+        """Requests the pitch-shifted render of a file
+
+        The render is staged once it's ready, by the thread that finished
+        it, and plays from the next loop restart.
+        """
+        if self.pitch_shifter is None:
+            return
+        future = self.pitch_shifter.request(file.file_name, file.fx.pitch_adjust)
+        if future is None:
+            self.stage(file)
+        else:
+            future.add_done_callback(lambda _: self.stage(file))
+
+    def refresh_renders(self):
+        """Requests the renders of every file, after a pitch changed"""
+        for file in self.files + self.added:
+            self.request_render(file)
+
+    def stage(self, file: WavFile):
+        """Stages the audio a file plays from the next loop restart"""
+        file.staged = self.track_audio(file)
+
+    def track_audio(self, file: WavFile) -> np.ndarray:
+        """Returns the audio a file plays, pitch-shifted once it's rendered
+
+        Never waits for a render, the original audio plays until then.
+        Decodes the file on a cache miss, never call it while reading.
+        """
+        data = self.track_cache.get(file.file_name)
+        if self.pitch_shifter is None or not file.fx.pitch_adjust:
+            return data
+        shifted = self.pitch_shifter.rendered(
+            file.file_name, data, file.fx.pitch_adjust)
+        return data if shifted is None else shifted
+
+    def add_track(self, file_path: str, slip: int = 0, fx: FxSettings = None):
         """Adds a track to be played the next time around the loop
 
         The track has been added to the Loop, play it from the start
-        the next time around.
+        the next time around. `fx` are the FxSettings of the added Track.
         """
-        file = WavFile(sound_file=sf.SoundFile(file_path), slip=slip)
-        self.tracks_to_add.put(file)
+        file = self.open_file(file_path, slip=slip, waiting=True, fx=fx)
+        # Appending is atomic, the file is complete before it's visible
+        self.added.append(file)
+
+    def admit_tracks(self):
+        """Moves the tracks added since the last block into the file list
+
+        Called before a block is read, so the block has room for them.
+        They wait for the loop to restart before they play. Only reads
+        the length of the list of added files, takes no lock.
+        """
+        while self.admitted < len(self.added):
+            self.files.append(self.added[self.admitted])
+            self.admitted += 1
+            self.revision += 1
 
     def close_file(self, file_path):
-        """Closes an open file handle when a track is removed during playback
+        """Stops reading a file when a track is removed during playback
 
         Called to stop the reading of a track file when the track is
-        removed using the UI. File handles are kept open for performance
-        and not checked on every read, so this signal closes the necessary
-        file.
+        removed using the UI. The decoded audio stays in the TrackCache
+        in case the track is added again.
         """
         for index, file in enumerate(self.files):
-            if file.sound_file.name == file_path:
-                file.sound_file.close()
+            if file.file_name == file_path:
                 del self.files[index]
+                self.revision += 1
                 break
 
     def close_all_files(self):
-        """Closes all file handles
+        """Stops reading all files
 
-        Closes all open resources, called upon loading a new loop or
-        exiting the program.
+        Called upon loading a new loop or exiting the program.
         """
-        for file in self.files:
-            file.sound_file.close()
         self.files = []
+        self.added = []
+        self.admitted = 0
+        self.revision += 1
+
+    @property
+    def loop_length(self) -> int:
+        """Length of the loop in samples, set by the 'master' track
+
+        Currently hard-coded to always be the first track
+        """
+        if not self.files:
+            return 0
+        return self.files[0].data.shape[0]
 
     def restart_loop(self):
         """Called to restart the reading of files at the beginning
 
-        Starts the reading of files from the beginning, resets cursors,
-        and checks for new files to read from.
+        Resets the cursor and starts playing the tracks that were
+        waiting for the loop to restart. Staged audio, e.g. pitch-shifted
+        renders that are ready, is swapped in here, so pitch changes on
+        the loop boundary. Only swaps references, it never decodes.
         """
-        # Any Tracks that were added to the Loop should now be read
-        while self.tracks_to_add.qsize() != 0:
-            self.files.append(self.tracks_to_add.get())
-
-        # Reset the file to initial state
         for file in self.files:
-            file.sound_file.seek(0)
-            file.is_slipping = file.slip > 0
-            file.finished_reading = False
+            file.data = file.staged
+            file.waiting = False
 
         self.read_cursor = 0
 
+    def read_segment(self, file: WavFile, out: np.ndarray, loop_length: int):
+        """Reads the samples of a file at the read cursor into `out`
+
+        A file's first sample plays `slip` samples into the loop, the slip
+        is applied as an offset modulo the loop length, so a slipped file
+        wraps around the loop end and costs no more than one that isn't.
+        Samples past the file's end, or while it is waiting, are silent.
+
+        A reversed file is read from a negative-stride view of the cached
+        audio, so reversing is checked every block and takes no copy.
+        """
+        if file.waiting:
+            out[:] = 0
+            return
+        data = file.data[::-1] if file.fx.is_reversed else file.data
+        start = (self.read_cursor - file.slip) % loop_length
+        first = min(out.shape[0], loop_length - start)
+        self.copy_run(data, start, out[:first])
+        self.copy_run(data, 0, out[first:])
+
+    @staticmethod
+    def copy_run(data: np.ndarray, start: int, out: np.ndarray):
+        """Copies the samples of `data` from `start` into `out`
+
+        Samples past the end of `data` are silent.
+        """
+        last = min(max(data.shape[0] - start, 0), out.shape[0])
+        out[:last] = data[start:start + last]
+        out[last:] = 0
+
+    def read_into(self, stack: np.ndarray) -> int:
+        """Reads multiple files into a preallocated block stack
+
+        The stack has the shape (BLOCK_SIZE, TRACKS, CHANNELS) with one
+        track per file. The block is always full: when the loop ends within
+        it, reading continues from the start of the loop.
+
+        Returns the frame offset in the block at which the loop restarted,
+        or None if it didn't restart.
+        """
+        blocksize = stack.shape[0]
+        loop_length = self.loop_length
+        if loop_length == 0:
+            stack[:] = 0
+            return None
+
+        restart = None
+        offset = 0
+        while offset < blocksize:
+            if self.read_cursor >= loop_length:
+                self.restart_loop()
+                restart = offset
+            frames = min(blocksize - offset, loop_length - self.read_cursor)
+            for index, file in enumerate(self.files):
+                self.read_segment(
+                    file, stack[offset:offset + frames, index], loop_length)
+            self.read_cursor += frames
+            offset += frames
+
+        return restart
+
     def read_to_list(self) -> List[np.ndarray]:
-        """Reads multiple SoundFile objects to a list of numpy blocks
+        """Reads multiple files to a list of numpy blocks
 
-        Reads the SoundFile objects block-wise into a list of numpy arrays.
+        Reads the files block-wise into a list of numpy arrays, which are
+        views into a stack owned by the reader and only valid until the
+        next read.
 
         Returns a list of form:
         [(BLOCK_SIZE, CHANNELS), (BLOCK_SIZE, CHANNELS), ...]
         """
-        output_data = []
-        is_last_block = False
-
-        for file in self.files:
-            # Check if the file is still slipping
-            if file.is_slipping and self.read_cursor >= file.slip:
-                file.is_slipping = False
-
-            if file.finished_reading or file.is_slipping:
-                # Nothing to play, send a zero array instead
-                block: np.ndarray = np.zeros(
-                    (self.blocksize, sd.default.channels[1]))
-                output_data.append(block)
-            else:
-                block: np.ndarray = file.sound_file.read(self.blocksize)
-                if not block.any():
-                    # No more blocks to read, mark it as done
-                    file.finished_reading = True
-                output_data.append(block)
-
-        self.read_cursor += self.blocksize
-
-        # Restart the loop if the 'master' track is finished
-        # Currently hard-coded to always be the first track
-        if self.files[0].finished_reading:
-            self.restart_loop()
-            is_last_block = True
-
-        self.last_block_notifier_queue.put(is_last_block)
-        if is_last_block:
-            # Remove an item from the queue if this is the last block
-            # The aggregator won't put an item in the queue on the empty (last)
-            # block, so remove an item here to keep the queues in sync.
-            self.last_block_notifier_queue.get()
-
-        return output_data
+        self.admit_tracks()
+        if self.stack.shape[1] != len(self.files):
+            self.stack = np.zeros(
+                (self.blocksize, len(self.files), CHANNELS), dtype='float32')
+        self.read_into(self.stack)
+        return [self.stack[:, index] for index in range(len(self.files))]
@@ -3,11 +3,81 @@
 # Roughly 46ms per block given sample rate = 44100
 BLOCK_SIZE = 2048
 
-# Player Queue size
-PLAYER_QUEUE_SIZE = 10
+# Channels of the mix, every track is mixed to stereo
+CHANNELS = 2
+
+# How the Player gets its audio
+# 'push': an Aggregator thread mixes ahead into the Player's ring buffer
+# 'pull': the Player's callback mixes each block as the device asks for it
+ENGINE_MODE = 'push'
+
+# Whether playback and recording share one full-duplex device stream
+# Recordings are then aligned to the playback cursor at the exact sample
+DUPLEX_STREAM = False
+
+# Frames buffered between the Aggregator and the Player in 'push' mode
+# Roughly 460ms given sample rate = 44100
+PLAYER_BUFFER_FRAMES = 10 * BLOCK_SIZE
+
+# Frames of input buffered between the Recorder's callback and its writer
+# Roughly 6 seconds given sample rate = 44100, the writer only falls
+# that far behind on a stalled disk
+RECORDER_BUFFER_FRAMES = 128 * BLOCK_SIZE
+
+# Frames the Recorder's writer gathers into each write to the file
+RECORDER_WRITE_FRAMES = 8 * BLOCK_SIZE
+
+# Longest take the Recorder keeps in memory, longer takes play from
+# their file once it is finalized
+# Roughly 3 minutes given sample rate = 44100
+RECORDER_TAKE_FRAMES = 4096 * BLOCK_SIZE
+
+# Seconds the Recorder waits for its writer once recording stops
+RECORDER_STOP_TIMEOUT = 10
 
 # Reader Queue size
 READER_QUEUE_SIZE = 10
 
+# Audio backend the streams are opened with: 'sounddevice' for the
+# devices of the machine, 'virtual' to run without sound hardware
+AUDIO_BACKEND = 'sounddevice'
+
 # Default sample rate
 SAMPLE_RATE = 44100
+
+# Memory budget of the decoded track cache in bytes
+# Roughly 25 minutes of stereo float32 audio at 44100 Hz
+TRACK_CACHE_BYTES = 512 * 1024 * 1024
+
+# Directory of the raw PCM sidecar files that tracks are memory-mapped from
+SIDECAR_DIRECTORY = 'resources/cache/pcm'
+
+# Processes rendering pitch-shifted tracks in the background
+PITCH_SHIFT_WORKERS = 2
+
+# Memory budget of the rendered pitch-shifted tracks in bytes
+PITCH_CACHE_BYTES = 256 * 1024 * 1024
+
+# Per-device settings, e.g. the block size found by the AutoTuner
+SETTINGS_FILE = 'settings/settings.json'
+
+# Block sizes and buffer depths, in blocks, tried by the AutoTuner
+TUNER_BLOCK_SIZES = (256, 512, 1024, 2048, 4096)
+TUNER_BUFFER_BLOCKS = (2, 4, 6, 8, 10)
+
+# Seconds each setting is played for by the AutoTuner, after warming up
+TUNER_TRIAL_SECONDS = 3.
+
+# Longest callback, as a fraction of a block, the AutoTuner considers stable
+TUNER_MAX_LOAD = 0.7
+
+# Whether the engine times its reading, mixing, callbacks and writes
+# Can be switched on while running, costs two calls per block when off
+TELEMETRY_ENABLED = False
+
+# Frames mixed per block when rendering a Loop to a file offline
+# Larger than the playback block, no device is waiting for it
+OFFLINE_BLOCK_SIZE = 32 * BLOCK_SIZE
+
+# Processes rendering Loop files in parallel, None for one per CPU
+OFFLINE_WORKERS = None
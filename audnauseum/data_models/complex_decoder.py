@@ -31,9 +31,12 @@ class ComplexDecoder(json.JSONDecoder):
                              is_on=obj['is_on']
                              )
         if type == 'Track':
+            # The saved length spares opening the file
             return Track(file_name=obj['file_name'],
                          beats=obj['beats'],
-                         fx=obj['fx'])
+                         fx=obj['fx'],
+                         samples=obj.get('samples'),
+                         samplerate=obj.get('samplerate'))
 
         if type == 'Loop':
             return Loop(file_path=obj['file_path'],
@@ -5,7 +5,12 @@ class FxSettings:
     """FxSettings are an attribute of both Tracks and Loops.
 
     Only "_slip" doesn't make sense when applying effects to loops
+
+    The class-wide revision is incremented whenever a setting that affects
+    the mix changes, so the mixer only rebuilds its gains when needed.
     """
+    revision = 0
+
     _volume: float
     _pan: float
     _is_reversed: bool
@@ -47,6 +52,7 @@ class FxSettings:
     def volume(self, value):
         if(0. <= value <= 1.):
             self._volume = value
+            FxSettings.revision += 1
 
     @property
     def pan(self):
@@ -55,6 +61,7 @@ class FxSettings:
     @pan.setter
     def pan(self, value):
         self._pan = value
+        FxSettings.revision += 1
 
     @property
     def is_reversed(self):
@@ -5,7 +5,10 @@ from .fx_settings import FxSettings
 
 class Track(object):
     '''A track represents an audio stream and a set of
-    parameters that allow different tracks to sync together'''
+    parameters that allow different tracks to sync together
+
+    The file is only opened when its length is first needed, so loading
+    a Loop whose JSON already holds the lengths opens no files.'''
 
     _samples: int
     _samplerate: int
@@ -15,17 +18,15 @@ class Track(object):
     _bpm: float
     _fx: FxSettings
 
-    def __init__(self, file_name, beats=None, fx=None, slip=None):
-        file = sf.SoundFile(file_name)
-        self._samples = len(file)
-        self._samplerate = file.samplerate
+    def __init__(self, file_name, beats=None, fx=None, slip=None,
+                 samples=None, samplerate=None):
+        self._samples = samples
+        self._samplerate = samplerate
         self._file_name = file_name
         self._beats: int = beats
-        self._ms_length: float = self.samples / self.samplerate * 1000
-        if self._ms_length != 0 and self.beats is not None:
-            self._bpm: float = self.beats / self._ms_length * 60000
-        else:
-            self._bpm = None
+        # Computed from the length when first read
+        self._ms_length = None
+        self._bpm = None
         if fx:
             self._fx = fx
         else:
@@ -65,16 +66,30 @@ class Track(object):
     def file_name(self, val):
         self._file_name = val
 
+    def read_info(self):
+        """Reads the length and sample rate from the file
+
+        Raises if the file can't be opened as audio.
+        """
+        with sf.SoundFile(self._file_name) as file:
+            self._samples, self._samplerate = len(file), file.samplerate
+
     @property
     def samples(self):
+        if self._samples is None or self._samplerate is None:
+            self.read_info()
         return self._samples
 
     @property
     def samplerate(self):
+        if self._samples is None or self._samplerate is None:
+            self.read_info()
         return self._samplerate
 
     @property
     def bpm(self):
+        if self._bpm is None and self.beats is not None and self.ms_length != 0:
+            self._bpm = self.beats / self.ms_length * 60000
         return self._bpm
 
     @bpm.setter
@@ -91,6 +106,8 @@ class Track(object):
 
     @property
     def ms_length(self):
+        if self._ms_length is None:
+            self._ms_length = self.samples / self.samplerate * 1000
         return self._ms_length
 
     @ms_length.setter
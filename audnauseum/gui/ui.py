@@ -102,9 +102,8 @@ def whichbtn(ui, looper: Looper, _str):
     # print("clicked button is", _str)
 
     if _str == 'reverse':
-        # TODO need function in looper to set reverse
-        # print('reversed')
-        pass
+        if ui.listWidget.count() > 0:
+            looper.track_toggle_reverse(get_track(ui, looper))
     elif _str == 'metro_toggle':
         # TODO need function to turn on metronome
         # print('metronome toggled')
@@ -117,12 +116,13 @@ def slider_value(ui, looper: Looper, _str):
     sValue = -1
 
     if _str == 'trackPan':
-        sValue = ui.trackPan.value()
-        # TODO need to send track with value
-        # looper.set_pan(sValue)
+        if ui.listWidget.count() > 0:
+            sValue = ui.trackPan.value()
+            track = get_track(ui, looper)
+            looper.track_set_pan(track, looper.convert_gui_to_pan(sValue))
     elif _str == 'loopPan':
         sValue = ui.loopPan.value()
-        looper.set_pan(sValue)
+        looper.set_pan(looper.convert_gui_to_pan(sValue))
     elif _str == 'trackSlip':
         sValue = ui.trackSlip.value()
         # TODO need function in looper to send value
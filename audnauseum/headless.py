@@ -0,0 +1,209 @@
+import argparse
+import json
+import shlex
+import sys
+import time
+
+from audnauseum.audio_tools.audio_backend import create_backend, set_backend
+from audnauseum.audio_tools.offline_renderer import OfflineRenderer
+from audnauseum.startup_timer import startup_timer
+from audnauseum.state_machine.looper import Looper
+
+
+class Headless:
+    """Drives the Looper from text commands, without the GUI
+
+    Commands are read one per line from a script or stdin, so servers and
+    batch jobs can play, record and render Loops on machines without Qt
+    or a display. Only the engine is imported.
+
+    Transport commands fire the Looper's triggers like the GUI's buttons,
+    so they follow the same state machine. Playback and recording run in
+    the audio device's callbacks, `wait` lets them run for a while before
+    the next command.
+
+    Lines starting with '#' are comments.
+    """
+    # Usage of each command, printed by 'help'
+    COMMANDS = {
+        'load': 'load <loop.json>      load a Loop',
+        'save': 'save <loop.json>      save the current Loop',
+        'add': 'add <track.wav>       add a Track to the Loop',
+        'remove': 'remove <track.wav>    remove a Track from the Loop',
+        'play': 'play                  play the Loop',
+        'record': 'record                start or stop recording',
+        'pause': 'pause                 pause or resume playback',
+        'stop': 'stop                  stop playing and recording',
+        'wait': 'wait <seconds>        let the engine run',
+        'volume': 'volume <0-100>        set the Loop volume',
+        'pan': 'pan <-1-1>            set the Loop pan',
+        'bpm': 'bpm <bpm>             set the metronome tempo',
+        'beats': 'beats <beats>         set the metronome beats per bar',
+        'metronome': 'metronome             turn the metronome on or off',
+        'render': 'render <file> [n]     mix n repetitions of the Loop to a WAV/FLAC file',
+        'tracks': 'tracks                list the Tracks of the Loop',
+        'state': 'state                 print the Looper state',
+        'stats': 'stats                 print the engine statistics as JSON',
+        'telemetry': 'telemetry <on|off>    time the engine\'s real-time work',
+        'help': 'help                  print this list',
+        'quit': 'quit                  shut down',
+    }
+    looper: Looper
+
+    def __init__(self, looper: Looper = None):
+        self.looper = looper
+        if self.looper is None:
+            self.looper = Looper()
+
+    def run(self, lines) -> bool:
+        """Executes each line of commands until the lines end or 'quit'
+
+        Returns False if a command failed.
+        """
+        succeeded = True
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            command, *args = shlex.split(line)
+            if command in ('quit', 'exit'):
+                break
+            succeeded = self.execute(command, *args) and succeeded
+        return succeeded
+
+    def execute(self, command: str, *args) -> bool:
+        """Executes a single command, returns whether it succeeded"""
+        if command not in Headless.COMMANDS:
+            print(f'Unknown command: {command}, try help')
+            return False
+        try:
+            result = getattr(self, f'do_{command}')(*args)
+            return result is not False
+        except Exception as e:
+            print(f'Exception while executing {command} {" ".join(args)}')
+            print(f'Message: {e}')
+            return False
+
+    def do_load(self, file_path: str):
+        loop = self.looper.loop
+        # Loading a Loop without tracks leaves the Looper idle, the
+        # transition fails but the Loop was loaded
+        return self.looper.load(file_path) or self.looper.loop is not loop
+
+    def do_save(self, file_path: str):
+        self.looper.write_loop(file_path)
+
+    def do_add(self, file_path: str):
+        return self.looper.add_track(file_path)
+
+    def do_remove(self, file_path: str):
+        return self.looper.remove_track(file_path)
+
+    def do_play(self):
+        return self.looper.play()
+
+    def do_record(self):
+        return self.looper.record()
+
+    def do_pause(self):
+        return self.looper.pause()
+
+    def do_stop(self):
+        return self.looper.stop()
+
+    def do_wait(self, seconds: str):
+        time.sleep(float(seconds))
+
+    def do_volume(self, volume: str):
+        return self.looper.set_volume(int(volume))
+
+    def do_pan(self, pan: str):
+        return self.looper.set_pan(float(pan))
+
+    def do_bpm(self, bpm: str):
+        return self.looper.metronome_set_bpm(int(bpm))
+
+    def do_beats(self, beats: str):
+        return self.looper.metronome_set_beats(int(beats))
+
+    def do_metronome(self):
+        return self.looper.metronome_toggle()
+
+    def do_render(self, output_path: str, repetitions: str = '1'):
+        # Shares the Looper's decoded tracks, nothing is decoded again
+        renderer = OfflineRenderer(repetitions=int(repetitions),
+                                   track_cache=self.looper.track_cache)
+        result = renderer.write(self.looper.loop, output_path)
+        print(f'{output_path}: {result["seconds"]:.1f}s of audio '
+              f'in {result["elapsed"]:.2f}s')
+
+    def do_tracks(self):
+        for track in self.looper.get_track_list():
+            print(track.file_name)
+
+    def do_state(self):
+        print(self.looper.state.name)
+
+    def do_stats(self):
+        print(json.dumps(self.looper.get_telemetry(), indent=4, default=str))
+
+    def do_telemetry(self, enabled: str):
+        self.looper.set_telemetry(enabled == 'on')
+
+    def do_help(self):
+        for usage in Headless.COMMANDS.values():
+            print(usage)
+
+
+def read_commands(script):
+    """Yields the lines of a script, prompting for them on a terminal"""
+    if script is sys.stdin and script.isatty():
+        while True:
+            try:
+                yield input('> ')
+            except EOFError:
+                return
+    else:
+        yield from script
+
+
+def main(argv: list = None) -> int:
+    """Runs the engine from a script of commands, or from stdin
+
+    Returns the process exit status: 1 if a command failed.
+    """
+    parser = argparse.ArgumentParser(
+        description='Runs the AudNauseum engine without the GUI')
+    parser.add_argument('script', nargs='?', default='-',
+                        help="file of commands, '-' or none for stdin")
+    parser.add_argument('-l', '--loop', help='Loop JSON file to load first')
+    parser.add_argument('--backend', choices=['sounddevice', 'virtual'],
+                        help='audio backend, virtual runs without sound hardware')
+    parser.add_argument('--startup-time', action='store_true',
+                        help='print how long starting up took')
+    args = parser.parse_args(argv)
+
+    if args.startup_time:
+        startup_timer.enabled = True
+    startup_timer.mark('imports')
+    if args.backend:
+        set_backend(create_backend(args.backend))
+    headless = Headless()
+    startup_timer.mark('engine')
+    startup_timer.report()
+    succeeded = True
+    try:
+        if args.loop:
+            succeeded = headless.execute('load', args.loop)
+        if args.script == '-':
+            succeeded = headless.run(read_commands(sys.stdin)) and succeeded
+        else:
+            with open(args.script, 'r') as script:
+                succeeded = headless.run(script) and succeeded
+    finally:
+        headless.looper.shut_down(None)
+    return 0 if succeeded else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
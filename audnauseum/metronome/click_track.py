@@ -0,0 +1,113 @@
+import math
+
+import numpy as np
+import soundfile as sf
+
+from audnauseum.constants import SAMPLE_RATE
+from audnauseum.metronome.metronome import Metronome
+
+DOWN_BEAT_FILE = './resources/metronome/downBeat.wav'
+BEAT_FILE = './resources/metronome/beat.wav'
+
+
+class ClickTrack:
+    """Renders the Metronome's clicks into the mix
+
+    Clicks are placed at exact sample positions on a grid of beats that
+    starts with the loop, so the metronome is locked to the audio clock
+    instead of a sleeping thread. Position 0 is the first sample of the
+    loop, a count-in bar sits at the negative positions before it.
+
+    The click samples are read from disk once and shared by every
+    ClickTrack. Aggregator.start() loads them before playback, so a
+    click never reads from disk in the device's callback.
+    """
+    samplerate: int
+
+    # (down beat, beat) samples, loaded on first use
+    _clicks = None
+
+    def __init__(self, samplerate: int = SAMPLE_RATE):
+        self.samplerate = samplerate
+        # Shared samples are used unless replaced
+        self._down_beat = None
+        self._beat = None
+
+    @classmethod
+    def load_clicks(cls):
+        """Reads the click samples into memory, only the first time"""
+        if cls._clicks is None:
+            down_beat, _ = sf.read(DOWN_BEAT_FILE, dtype='float32')
+            beat, _ = sf.read(BEAT_FILE, dtype='float32')
+            cls._clicks = (down_beat, beat)
+        return cls._clicks
+
+    @property
+    def down_beat(self) -> np.ndarray:
+        if self._down_beat is None:
+            return self.load_clicks()[0]
+        return self._down_beat
+
+    @down_beat.setter
+    def down_beat(self, samples: np.ndarray):
+        self._down_beat = samples
+
+    @property
+    def beat(self) -> np.ndarray:
+        if self._beat is None:
+            return self.load_clicks()[1]
+        return self._beat
+
+    @beat.setter
+    def beat(self, samples: np.ndarray):
+        self._beat = samples
+
+    def is_active(self, met: Metronome) -> bool:
+        """Checks whether the Metronome is on and fully set up"""
+        return bool(met.is_on and met.bpm and met.beats)
+
+    def samples_per_beat(self, met: Metronome) -> float:
+        return self.samplerate * 60. / met.bpm
+
+    def count_in_frames(self, met: Metronome) -> int:
+        """Length of the count-in bar played before the loop starts"""
+        if not (self.is_active(met) and met.count_in):
+            return 0
+        return round(met.beats * self.samples_per_beat(met))
+
+    def render(self, out: np.ndarray, met: Metronome, position: int, restart: int = None):
+        """Adds the clicks of a block to the mixed audio in `out`
+
+        `position` is the grid position of the first frame in the block.
+        `restart` is the frame offset at which the loop started again,
+        from there the clicks continue from position 0.
+        """
+        if not self.is_active(met):
+            return
+        if restart is None:
+            self.render_segment(out, met, position)
+        else:
+            self.render_segment(out[:restart], met, position)
+            self.render_segment(out[restart:], met, 0)
+
+    def render_segment(self, out: np.ndarray, met: Metronome, position: int):
+        """Adds the clicks of a contiguous range of positions to `out`"""
+        frames = out.shape[0]
+        if frames == 0:
+            return
+        samples_per_beat = self.samples_per_beat(met)
+        longest = max(self.down_beat.shape[0], self.beat.shape[0])
+
+        # Every beat whose click overlaps the range, including one that
+        # started before it and is still sounding
+        first = math.ceil((position - longest + 1) / samples_per_beat)
+        last = math.floor((position + frames - 1) / samples_per_beat)
+        for beat in range(first, last + 1):
+            click = self.down_beat if beat % met.beats == 0 else self.beat
+            start = round(beat * samples_per_beat) - position
+            skip = max(-start, 0)
+            offset = max(start, 0)
+            length = min(click.shape[0] - skip, frames - offset)
+            if length > 0:
+                out[offset:offset + length] += \
+                    met.volume * click[skip:skip + length, np.newaxis]
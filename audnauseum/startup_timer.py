@@ -0,0 +1,39 @@
+from time import perf_counter
+
+
+class StartupTimer:
+    """Measures how long each step of starting AudNauseum takes
+
+    Off unless AudNauseum is started with --startup-time. The clock
+    starts when this module is first imported, which main.py does
+    before anything else.
+    """
+    enabled: bool
+    started: float
+    last: float
+    steps: list
+
+    def __init__(self):
+        self.enabled = False
+        self.started = self.last = perf_counter()
+        self.steps = []
+
+    def mark(self, step: str):
+        """Records the time since the previous step"""
+        if not self.enabled:
+            return
+        now = perf_counter()
+        self.steps.append((step, now - self.last))
+        self.last = now
+
+    def report(self):
+        """Prints the time of every step and the total"""
+        if not self.enabled:
+            return
+        for step, seconds in self.steps:
+            print(f'{step:>10}: {seconds * 1000:8.1f} ms')
+        print(f'{"total":>10}: {(self.last - self.started) * 1000:8.1f} ms')
+
+
+# Shared by the entry points
+startup_timer = StartupTimer()
@@ -5,8 +5,16 @@ from audnauseum.data_models.track import Track
 from audnauseum.data_models.complex_decoder import ComplexDecoder
 from audnauseum.audio_tools.recorder import Recorder
 from audnauseum.audio_tools.aggregator import Aggregator
+from audnauseum.audio_tools.audio_backend import get_backend
+from audnauseum.audio_tools.auto_tuner import device_name, load_tuning
+from audnauseum.audio_tools.device_manager import DeviceManager
+from audnauseum.audio_tools.track_cache import TrackCache
+from audnauseum.audio_tools.pcm_store import PcmStore
+from audnauseum.audio_tools.pitch_shifter import PitchShifter
+from audnauseum.audio_tools.telemetry import Telemetry
 from transitions import Machine
-import sounddevice as sd
+from audnauseum.constants import BLOCK_SIZE, DUPLEX_STREAM, ENGINE_MODE, \
+    PLAYER_BUFFER_FRAMES, SAMPLE_RATE
 import enum
 import json
 
@@ -42,8 +50,16 @@ class Looper:
     player: Player
     machine: Machine
     recorder: Recorder
+    backend: object
+    engine_mode: str
+    duplex: bool
+    devices: DeviceManager
     aggregator: Aggregator
     reader: WavReader
+    track_cache: TrackCache
+    pcm_store: PcmStore
+    pitch_shifter: PitchShifter
+    telemetry: Telemetry
 
     transitions = [
         # idle state transitions
@@ -149,49 +165,105 @@ class Looper:
          'dest': 'None'},  # Not a transition
     ]
 
-    def __init__(self, loop=None):
+    def __init__(self, loop=None, engine_mode=ENGINE_MODE, duplex=DUPLEX_STREAM,
+                 backend=None):
         self.machine = Machine(model=self, states=LooperStates,
                                initial=LooperStates.IDLE,
                                transitions=Looper.transitions,
                                ignore_invalid_triggers=True,
                                after_state_change=self.echo_state_change)
 
-        self.set_default_channels()
+        # sounddevice, unless a virtual device was chosen. The devices are
+        # only probed and opened when audio first plays or records, so
+        # starting up doesn't wait on them.
+        self.backend = backend
+        if self.backend is None:
+            self.backend = get_backend()
+        self.engine_mode = engine_mode
+        self.duplex = duplex
 
+        # The default loop is empty, it is built in memory
         if loop is None:
             self.loop = Loop()
         else:
             self.loop = loop
 
-        self.recorder = Recorder(loop=self.loop)
-        self.player = Player(loop=self.loop)
-        self.reader = WavReader(
-            loop=self.loop, last_block_notifier_queue=self.player.last_block_notifier_queue)
+        # Decoded audio is kept for the whole session, so loading a loop
+        # again or replaying it doesn't decode the files again. Tracks are
+        # memory-mapped from raw PCM sidecars written when they are added.
+        self.pcm_store = PcmStore()
+        self.track_cache = TrackCache(store=self.pcm_store)
+        self.pitch_shifter = PitchShifter(self.track_cache)
+        # One set of timings for the whole engine
+        self.telemetry = Telemetry()
+        # Created with the input stream, once its channels are known
+        self.recorder = None
+        self.build_engine(BLOCK_SIZE, PLAYER_BUFFER_FRAMES)
+
+    def build_engine(self, blocksize: int, buffer_frames: int):
+        """Creates the Player, reader and Aggregator for a block size
+
+        The DeviceManager is created too, its streams aren't opened yet.
+        """
+        self.player = Player(loop=self.loop, blocksize=blocksize,
+                             buffer_frames=buffer_frames)
+        self.devices = DeviceManager(self.player, self.recorder,
+                                     duplex=self.duplex, blocksize=blocksize,
+                                     backend=self.backend)
+        self.reader = WavReader(loop=self.loop, blocksize=blocksize,
+                                track_cache=self.track_cache,
+                                pitch_shifter=self.pitch_shifter)
         self.aggregator = Aggregator(
-            loop=self.loop, player_queue=self.player.input_queue, reader=self.reader)
+            loop=self.loop, ring=self.player.ring, reader=self.reader,
+            mode=self.engine_mode)
+        # In 'pull' mode the Player's callback mixes each block itself
+        if self.engine_mode == 'pull':
+            self.player.source = self.aggregator
+        self.aggregator.telemetry = self.telemetry
+        self.player.telemetry = self.telemetry
+
+    def open_devices(self):
+        """Probes the audio devices and opens their streams, once
+
+        Called before audio first plays or records. The streams stay open
+        until shutting down, transport actions are gated inside their
+        callbacks.
+        """
+        if self.devices.is_open:
+            return
+        self.set_default_channels()
+
+        # Start at the lowest stable latency the AutoTuner found for
+        # the device, if it was tuned for this engine mode
+        tuning = load_tuning(device_name(self.backend))
+        if tuning is not None and tuning['mode'] == self.engine_mode \
+                and (tuning['blocksize'], tuning['buffer_frames']) != \
+                (self.player.blocksize, self.player.ring.capacity):
+            self.build_engine(tuning['blocksize'], tuning['buffer_frames'])
 
-        # Create a default (empty track) loop upon startup & load it
-        default_path = './resources/json/default.json'
-        self.write_loop(default_path)
-        self.load_loop(default_path)
+        self.devices.open()
+        self.recorder = Recorder(loop=self.loop,
+                                 channels=self.devices.input_channels)
+        self.recorder.telemetry = self.telemetry
+        self.devices.recorder = self.recorder
 
     def set_default_channels(self):
-        """Detects and sets the default sounddevice channels
+        """Detects and sets the default channels of the audio backend
 
         Checks the Host APIs of the user's OS audio settings for the
         default input and output devices.
-        Sets the sounddevice default channels tuple to the capabilities
+        Sets the backend's default channels tuple to the capabilities
         of the input and output devices.
         On Linux, the default input/output devices are often a "virtual"
         device using ALSA and can have 32, 64, or even 128 channels. This
         value is clamped to 2 for what the physical device can support.
         """
-        for api in sd.query_hostapis():
+        for api in self.backend.query_hostapis():
             input_device = api.get('default_input_device')
             output_device = api.get('default_output_device')
             if input_device is not None and input_device >= 0 \
                     and output_device is not None and output_device >= 0:
-                devices = sd.query_devices()
+                devices = self.backend.query_devices()
                 input_channels = devices[input_device]['max_input_channels']
                 if input_channels > 2:
                     # Clamp value in case of virtual device
@@ -200,7 +272,7 @@ class Looper:
                 if output_channels > 2:
                     # Clamp value in case of virtual device
                     output_channels = 2
-                sd.default.channels = input_channels, output_channels
+                self.backend.default.channels = input_channels, output_channels
                 break
 
     def load_loop(self, file_path: str):
@@ -215,6 +287,8 @@ class Looper:
             self.reader.loop = self.loop
             self.aggregator.loop = self.loop
             self.player.loop = self.loop
+            if self.recorder is not None:
+                self.recorder.loop = self.loop
             return True
         except Exception as e:
             print(f'Exception while loading data from {file_path}')
@@ -252,15 +326,30 @@ class Looper:
         # TODO beats are currently hard-coded to be 20 for all new Tracks
         try:
             x = Track(file_path, beats=20)
+            # Fails here if the file can't be opened as audio
+            x.read_info()
+            self.prepare_track(file_path)
             self.loop.append(x)
             if self.state == LooperStates.PLAYING or self.state == LooperStates.PLAYING_AND_RECORDING:
-                self.aggregator.add_track(file_path)
+                self.aggregator.add_track(file_path, fx=x.fx)
             return True
         except Exception as e:
             print(
                 f'Exception while loading track from {file_path}\nMessage: {e}')
             return False
 
+    def prepare_track(self, file_path: str):
+        """Converts a Track's file to its raw PCM sidecar in the background
+
+        Done once when the Track is added so playback only ever maps
+        the sidecar, resampled to the engine's rate if needed. Stale cache
+        entries and pitch-shifted renders are dropped if the file changed.
+        """
+        if not self.pcm_store.is_valid(file_path):
+            self.track_cache.discard(file_path)
+            self.pitch_shifter.discard(file_path)
+            self.pcm_store.ensure_in_background(file_path)
+
     def unload_track(self, file_path: str):
         """Remove a Track from the looper.
 
@@ -281,33 +370,44 @@ class Looper:
         and plays them. Should be used in playing and playing_and_recording
         states.
         '''
+        self.open_devices()
         self.aggregator.start()
         self.player.play()
 
     def stop_playing(self, *args):
         """Stops the current playing output"""
-        self.loop.audio_cursor = 0
         if self.aggregator and self.aggregator.is_running:
             self.aggregator.stop()
         if self.player and self.player.playing:
             self.player.stop()
+        # The callback no longer moves the cursor once the Player stopped
+        self.loop.audio_cursor = 0
 
     def start_recording(self, *args):
         '''Writes input audio stream to disk and sends stream to output'''
-        self.recorder = Recorder(loop=self.loop)
+        self.open_devices()
         self.recorder.on_rec()
 
     def stop_recording(self, *args):
         '''Creates a Track from recording, appends to loop'''
         if self.recorder and self.recorder.recording:
             track = self.recorder.on_stop()
+            if track is None:
+                # The take couldn't be written, the Recorder reported why
+                return
+            # The take plays straight from memory, while its file is
+            # still being written. A take too long to keep in memory
+            # plays from its finalized file
+            if self.recorder.take is not None:
+                self.track_cache.put(track.file_name, self.recorder.take)
             self.loop.append(track)
 
             # Only inject the new track into the aggregator if playback
             # is currently happening. If playback is stopped, it'll find
             # the new track automatically the next time playback is started.
             if self.player.playing:
-                self.aggregator.add_track(track.file_name, slip=track.fx.slip)
+                self.aggregator.add_track(track.file_name, slip=track.fx.slip,
+                                          fx=track.fx)
 
     def start_playing_and_recording(self, *args):
         self.start_recording()
@@ -444,9 +544,13 @@ class Looper:
             return True
         return False
 
+    def convert_gui_to_pan(self, gui_scale_pan: int) -> float:
+        """Pan sliders range from -10 (left) to 10 (right)"""
+        return gui_scale_pan / 10.
+
     def set_pan(self, pan):
         if pan >= -1 and pan <= 1:
-            self.loop.fx.pitch_adjust = pan
+            self.loop.fx.pan = pan
             return True
         return False
 
@@ -486,7 +590,7 @@ class Looper:
         return False
 
     def track_set_pan(self, track, pan):
-        if pan >= 0 and pan <= 1:
+        if pan >= -1 and pan <= 1:
             track.fx.pan = pan
             return True
         return False
@@ -495,34 +599,44 @@ class Looper:
         track.fx.is_reversed = not(track.fx.is_reversed)
 
     def track_set_pitch_adjust(self, track, adjust):
+        """Sets a Track's pitch in semitones
+
+        The shifted Track is rendered in the background and plays from
+        the next loop restart after it's ready.
+        """
         track.fx.pitch_adjust = adjust
+        self.pitch_shifter.request(track.file_name, adjust)
+        # Stages the render for the files being played once it's ready
+        self.reader.refresh_renders()
 
     def track_pitch_adjust_inc(self, track):
-        track.fx.pitch_adjust += 1
+        self.track_set_pitch_adjust(track, track.fx.pitch_adjust + 1)
 
     def track_pitch_adjust_dec(self, track):
-        track.fx.pitch_adjust -= 1
+        self.track_set_pitch_adjust(track, track.fx.pitch_adjust - 1)
 
     def track_set_slip(self, track, slip_ms):
-        slip_ms %= track.ms_length
-        track.fx.slip = track.samples / track.samplerate * slip_ms
+        """Sets how far into the loop a Track starts, in milliseconds
+
+        The slip is stored in samples at the engine's rate, which the
+        Track's audio is resampled to, wrapped to the loop's length like
+        the reader wraps it. The loop's length is set by the 'master'
+        track, the first one.
+        """
+        slip = round(slip_ms * SAMPLE_RATE / 1000)
+        master = self.loop.tracks[0] if self.loop.tracks else track
+        length = round(master.samples * SAMPLE_RATE / master.samplerate) \
+            if master.samplerate else 0
+        track.fx.slip = slip % length if length else 0
 
     def track_slip_inc(self, track):
-        '''increments by 1 ms'''
-        if int(track.fx.slip + track.samplerate/1000) < track.samples:
-            track.fx.slip += track.samplerate/1000
-        else:
-            track.fx.slip = 0  # We hit the end of the file, so start over
+        '''increments by 1 ms, wrapping to the start at the end of the loop'''
+        self.track_set_slip(track, track.fx.slip * 1000 / SAMPLE_RATE + 1)
         return True
 
     def track_slip_dec(self, track):
-        '''decrements by 1 ms'''
-        if int(track.fx.slip - track.samplerate/1000) > 0:
-            track.fx.slip -= track.samplerate/1000
-        else:
-            track.fx.slip = track.samples - track.samplerate/1000
-            # We slipped back from the beginning of the file, so go to end, and
-            # back up 1ms
+        '''decrements by 1 ms, wrapping to the end at the start of the loop'''
+        self.track_set_slip(track, track.fx.slip * 1000 / SAMPLE_RATE - 1)
         return True
 
     def shut_down(self, event):
@@ -533,9 +647,44 @@ class Looper:
         print('Shutting down AudNauseum...')
 
         self.stop_playing_and_recording()
+        self.devices.close()
+        self.pitch_shifter.shut_down()
 
         print('Goodbye!')
 
+    def get_cache_stats(self) -> dict:
+        """Returns the hit/miss/eviction statistics of the TrackCache"""
+        return self.track_cache.stats()
+
+    def set_telemetry(self, enabled: bool):
+        """Switches the timing of the engine's real-time work on or off"""
+        self.telemetry.enabled = enabled
+
+    def get_telemetry(self) -> dict:
+        """Returns the engine's timings, fill levels and xrun counters
+
+        The Recorder's are included once the devices are open.
+        """
+        sources = dict(player=self.player, ring=self.player.ring,
+                       devices=self.devices, track_cache=self.track_cache)
+        if self.recorder is not None:
+            sources['recorder'] = self.recorder
+        return self.telemetry.snapshot(**sources)
+
+    def get_transport_stats(self) -> dict:
+        """Returns how long opening the devices and each transport took"""
+        return self.devices.stats()
+
+    def get_recording_stats(self) -> dict:
+        """Returns the fill level and overflow statistics of the Recorder"""
+        if self.recorder is None:
+            return {}
+        return self.recorder.stats()
+
+    def get_pitch_cache_stats(self) -> dict:
+        """Returns the statistics of the pitch-shifted renders"""
+        return self.pitch_shifter.stats()
+
     def get_track_list(self):
         return self.loop.tracks
 
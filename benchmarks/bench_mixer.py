@@ -0,0 +1,69 @@
+"""Per-block cost of the Mixer against the number of tracks
+
+Compares the batched Mixer with the per-track Python loop it replaced.
+Run from the repository root:
+
+    $ python -m benchmarks.bench_mixer
+"""
+import argparse
+import time
+
+import numpy as np
+
+from audnauseum.audio_tools.mixer import Mixer
+from audnauseum.constants import BLOCK_SIZE, CHANNELS, SAMPLE_RATE
+
+TRACK_COUNTS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def time_per_block(func, iterations: int) -> float:
+    """Returns the average duration of a call in microseconds"""
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_mixer(tracks: int, blocksize: int, iterations: int) -> float:
+    mixer = Mixer(blocksize=blocksize, tracks=tracks)
+    mixer.stack[:] = np.random.default_rng(0).uniform(
+        -1, 1, mixer.stack.shape)
+    mixer.set_gains(np.full(tracks, 1. / np.sqrt(tracks)))
+    out = np.empty((blocksize, CHANNELS), dtype='float32')
+    return time_per_block(lambda: mixer.mix(out), iterations)
+
+
+def bench_python_loop(tracks: int, blocksize: int, iterations: int) -> float:
+    blocks = [np.random.default_rng(i).uniform(-1, 1, (blocksize, CHANNELS))
+              for i in range(tracks)]
+    volumes = [1.] * tracks
+
+    def mix():
+        output_data = np.zeros((blocksize, CHANNELS))
+        for block, volume in zip(blocks, volumes):
+            np.add(output_data, block * volume, output_data)
+        np.multiply(output_data, 1. / np.sqrt(tracks), output_data)
+        return output_data
+
+    return time_per_block(mix, iterations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--blocksize', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    budget = args.blocksize / SAMPLE_RATE * 1e6
+    print(f'Block of {args.blocksize} frames, budget {budget:.0f} us')
+    print(f'{"tracks":>8} {"mixer us":>10} {"loop us":>10} {"% budget":>10}')
+    for tracks in TRACK_COUNTS:
+        mixer_us = bench_mixer(tracks, args.blocksize, args.iterations)
+        loop_us = bench_python_loop(tracks, args.blocksize, args.iterations)
+        print(f'{tracks:>8} {mixer_us:>10.1f} {loop_us:>10.1f} '
+              f'{mixer_us / budget * 100:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
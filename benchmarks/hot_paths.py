@@ -0,0 +1,286 @@
+"""Micro-benchmarks of the engine's hot paths
+
+Times reading, mixing and the Player's callback per block, and loading
+and saving Loops, over a sweep of track counts, block sizes and track
+lengths. No audio device is opened: tracks are synthetic audio put
+straight into a TrackCache, and the callback is called directly.
+
+Each result holds the best mean time per call in microseconds and the
+peak memory allocated by one call, as JSON so runs on two commits can
+be compared:
+
+    $ python -m benchmarks.hot_paths --output before.json
+    $ git checkout other-branch
+    $ python -m benchmarks.hot_paths --output after.json --compare before.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+import soundfile as sf
+
+from audnauseum.audio_tools.aggregator import Aggregator
+from audnauseum.audio_tools.audio_backend import CallbackFlags
+from audnauseum.audio_tools.player import Player
+from audnauseum.audio_tools.track_cache import TrackCache
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.constants import BLOCK_SIZE, CHANNELS, SAMPLE_RATE
+from audnauseum.data_models.complex_decoder import ComplexDecoder
+from audnauseum.data_models.loop import Loop
+from audnauseum.data_models.track import Track
+
+# Values swept, one parameter at a time around the defaults
+TRACK_COUNTS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+BLOCK_SIZES = (256, 512, 1024, 2048, 4096)
+TRACK_SECONDS = (1., 10., 60.)
+
+# Parameters held while another one is swept
+DEFAULT_TRACKS = 8
+DEFAULT_SECONDS = 2.
+
+# Each measurement runs for at least this long, the best of REPEATS counts
+MIN_TIME = 0.05
+REPEATS = 3
+
+
+def best_time(run, min_time: float = MIN_TIME, repeats: int = REPEATS) -> float:
+    """Best mean seconds per call
+
+    `run(number)` makes `number` calls and returns the seconds they took.
+    The number of calls is doubled until they take `min_time`.
+    """
+    number = 1
+    while run(number) < min_time:
+        number *= 2
+    return min(run(number) / number for _ in range(repeats))
+
+
+def timed(call):
+    """Wraps a call without arguments into a run() for best_time()"""
+    def run(number: int) -> float:
+        started = perf_counter()
+        for _ in range(number):
+            call()
+        return perf_counter() - started
+    return run
+
+
+def allocated(call, calls: int = 3) -> int:
+    """Peak bytes allocated during one call, the largest of a few calls
+
+    Tracing is restarted for every call, which resets its peak on
+    Python 3.8 too.
+    """
+    peak = 0
+    for _ in range(calls):
+        tracemalloc.start()
+        try:
+            call()
+            _, call_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak = max(peak, call_peak)
+    return peak
+
+
+def synthetic_loop(tracks: int, seconds: float, track_cache: TrackCache) -> Loop:
+    """A Loop of distinct noise tracks, decoded into `track_cache`"""
+    frames = int(seconds * SAMPLE_RATE)
+    rng = np.random.default_rng(0)
+    loop = Loop()
+    for index in range(tracks):
+        file_name = f'benchmark_track_{index}.wav'
+        data = rng.standard_normal((frames, CHANNELS), dtype='float32') * 0.1
+        track_cache.put(file_name, data)
+        loop.append(Track(file_name, beats=4, samples=frames,
+                          samplerate=SAMPLE_RATE))
+    return loop
+
+
+def bench_engine(tracks: int, blocksize: int, seconds: float) -> list:
+    """Times reading, mixing and the callback for one set of parameters"""
+    track_cache = TrackCache(budget=1 << 40)
+    loop = synthetic_loop(tracks, seconds, track_cache)
+    reader = WavReader(loop, blocksize=blocksize, track_cache=track_cache)
+    reader.open_files()
+    aggregator = Aggregator(loop, ring=None, reader=reader, mode='pull')
+    aggregator.click_track = None
+    blocks = reader.read_to_list()
+    out = np.empty((blocksize, CHANNELS), dtype='float32')
+
+    def aggregate():
+        aggregator.aggregate_list(blocks, out)
+
+    # The Player is driven as if the device called it, playing
+    player = Player(loop=loop, blocksize=blocksize, buffer_frames=2 * blocksize)
+    player.playing = player.previously_playing = True
+    status = CallbackFlags()
+    mixed = aggregator.read_and_mix().copy()
+
+    def callback_run(number: int) -> float:
+        # Only the callback is timed, not refilling its ring buffer
+        elapsed = 0.
+        for _ in range(number):
+            player.ring.write(mixed)
+            started = perf_counter()
+            player.callback(out, blocksize, None, status)
+            elapsed += perf_counter() - started
+        return elapsed
+
+    def callback():
+        player.ring.write(mixed)
+        player.callback(out, blocksize, None, status)
+
+    # In 'pull' mode the callback reads and mixes every block itself
+    pull_player = Player(loop=loop, blocksize=blocksize)
+    pull_player.playing = pull_player.previously_playing = True
+    pull_player.source = aggregator
+
+    def pull_callback():
+        pull_player.callback(out, blocksize, None, status)
+
+    cases = [
+        ('reader.read_to_list', timed(reader.read_to_list), reader.read_to_list),
+        ('aggregator.aggregate_list', timed(aggregate), aggregate),
+        ('player.callback', callback_run, callback),
+        ('player.callback_pull', timed(pull_callback), pull_callback),
+    ]
+    parameters = {'tracks': tracks, 'blocksize': blocksize, 'seconds': seconds}
+    return [result(name, parameters, run, call) for name, run, call in cases]
+
+
+def bench_serialization(tracks: int) -> list:
+    """Times loading and saving the JSON of a Loop with `tracks` tracks
+
+    The tracks are short files on disk. Loading is timed twice: with
+    the lengths saved in the JSON, which opens no files, and without
+    them, where reading each Track's length opens its file.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'track.wav')
+        sf.write(file_name, np.zeros((SAMPLE_RATE // 10, CHANNELS)), SAMPLE_RATE)
+        loop = Loop(tracks=[Track(file_name, beats=4) for _ in range(tracks)])
+        text = loop.to_json()
+        # The same Loop as saved before the lengths were kept in the JSON
+        data = json.loads(text)
+        for track in data['tracks']:
+            del track['samples'], track['samplerate']
+        text_without_lengths = json.dumps(data)
+        loop_path = os.path.join(directory, 'loop.json')
+
+        def decode():
+            json.loads(text, cls=ComplexDecoder)
+
+        def decode_and_open():
+            decoded = json.loads(text_without_lengths, cls=ComplexDecoder)
+            for track in decoded.tracks:
+                track.samples
+
+        def write():
+            loop.write_json(loop_path)
+
+        parameters = {'tracks': tracks}
+        return [result('ComplexDecoder.loads', parameters, timed(decode), decode),
+                result('ComplexDecoder.loads_open', parameters,
+                       timed(decode_and_open), decode_and_open),
+                result('Loop.write_json', parameters, timed(write), write)]
+
+
+def result(name: str, parameters: dict, run, call) -> dict:
+    seconds = best_time(run)
+    return dict(benchmark=name, **parameters, us=round(seconds * 1e6, 3),
+                allocated_bytes=allocated(call))
+
+
+def engine_cases(track_counts, block_sizes, track_seconds, grid: bool) -> list:
+    """(tracks, blocksize, seconds) of every engine benchmark
+
+    Each parameter is swept with the others at their defaults, or every
+    combination is run with `grid`.
+    """
+    if grid:
+        return list(itertools.product(track_counts, block_sizes, track_seconds))
+    cases = [(tracks, BLOCK_SIZE, DEFAULT_SECONDS) for tracks in track_counts]
+    cases += [(DEFAULT_TRACKS, blocksize, DEFAULT_SECONDS) for blocksize in block_sizes]
+    cases += [(DEFAULT_TRACKS, BLOCK_SIZE, seconds) for seconds in track_seconds]
+    # The defaults are in every sweep, run them once
+    return list(dict.fromkeys(cases))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(track_counts=TRACK_COUNTS, block_sizes=BLOCK_SIZES,
+        track_seconds=TRACK_SECONDS, grid: bool = False) -> dict:
+    """Runs every benchmark and returns the report"""
+    results = []
+    for tracks, blocksize, seconds in engine_cases(track_counts, block_sizes,
+                                                   track_seconds, grid):
+        print(f'{tracks=} {blocksize=} {seconds=}', file=sys.stderr)
+        results += bench_engine(tracks, blocksize, seconds)
+    for tracks in track_counts:
+        print(f'serialization {tracks=}', file=sys.stderr)
+        results += bench_serialization(tracks)
+    return {
+        'commit': git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict):
+    """Prints the change of every result also in the baseline"""
+    def key(result):
+        return tuple((name, value) for name, value in result.items()
+                     if name not in ('us', 'allocated_bytes'))
+
+    before = {key(result): result for result in baseline['results']}
+    for result in report['results']:
+        previous = before.get(key(result))
+        if previous is None or not previous['us']:
+            continue
+        parameters = ' '.join(f'{name}={value}' for name, value in key(result)[1:])
+        print(f'{result["benchmark"]:28} {parameters:40} '
+              f'{previous["us"]:>12.1f}us {result["us"]:>12.1f}us '
+              f'{result["us"] / previous["us"]:>6.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Times the hot paths of the engine, without an audio device')
+    parser.add_argument('--tracks', type=int, nargs='+', default=TRACK_COUNTS)
+    parser.add_argument('--blocksizes', type=int, nargs='+', default=BLOCK_SIZES)
+    parser.add_argument('--seconds', type=float, nargs='+', default=TRACK_SECONDS,
+                        help='lengths of the tracks')
+    parser.add_argument('--grid', action='store_true',
+                        help='run every combination instead of one sweep at a time')
+    parser.add_argument('--output', help='JSON file of the results, stdout if none')
+    parser.add_argument('--compare', help='JSON file of earlier results')
+    args = parser.parse_args()
+
+    report = run(args.tracks, args.blocksizes, args.seconds, args.grid)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(report, json.load(f))
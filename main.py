@@ -1,12 +1,24 @@
 import sys
 
-if __name__ == '__main__':
-    from audnauseum.app import app
+from audnauseum.startup_timer import startup_timer
 
+if __name__ == '__main__':
     # Require at least Python v3.8
     if sys.version_info.major < 3 or sys.version_info.minor < 8:
         print('Error: Python v3.8+ is required.', file=sys.stderr)
         print('Your version: ', file=sys.stderr)
         print(sys.version, file=sys.stderr)
 
+    # Prints how long starting up took
+    if '--startup-time' in sys.argv[1:]:
+        sys.argv.remove('--startup-time')
+        startup_timer.enabled = True
+
+    # The headless engine never imports PyQt5
+    if '--headless' in sys.argv[1:]:
+        from audnauseum.headless import main
+        sys.exit(main([arg for arg in sys.argv[1:] if arg != '--headless']))
+
+    from audnauseum.app import app
+
     sys.exit(app.exec_())
@@ -0,0 +1,163 @@
+from audnauseum.audio_tools.aggregator import Aggregator
+from audnauseum.audio_tools.ring_buffer import RingBuffer
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.data_models.loop import Loop
+from audnauseum.data_models.track import Track
+from audnauseum.metronome.click_track import ClickTrack
+
+import time
+import tracemalloc
+import unittest
+
+import numpy as np
+
+BASS = 'resources/recordings/bass4-4.wav'
+BEAT = 'resources/recordings/beat4-4.wav'
+
+
+def create_aggregator(mode='push', blocksize=2048):
+    loop = Loop(tracks=[Track(BASS), Track(BEAT)])
+    reader = WavReader(loop, blocksize=blocksize)
+    return Aggregator(loop, RingBuffer(10 * blocksize), reader, mode=mode)
+
+
+class AggregatorTest(unittest.TestCase):
+    """Test methods for reading and mixing blocks of Tracks"""
+
+    def test_read_and_mix_matches_list(self):
+        """The batched path mixes the same as the list path"""
+        aggregator = create_aggregator()
+        aggregator.reader.open_files()
+        blocks = aggregator.reader.read_to_list()
+        expected = aggregator.aggregate_list(blocks).copy()
+
+        aggregator.reader.open_files()
+        actual = aggregator.read_and_mix()
+        np.testing.assert_allclose(actual, expected)
+
+    def test_volume_change_applies(self):
+        aggregator = create_aggregator()
+        aggregator.reader.open_files()
+        loud = aggregator.read_and_mix().copy()
+
+        aggregator.reader.open_files()
+        aggregator.loop.fx.volume = 0.5
+        quiet = aggregator.read_and_mix()
+        np.testing.assert_allclose(quiet, loud * 0.5, rtol=1e-5, atol=1e-7)
+
+    def test_pan_change_applies(self):
+        """A pan change rebuilds the gains on the next block"""
+        aggregator = create_aggregator()
+        aggregator.reader.open_files()
+        center = aggregator.read_and_mix().copy()
+
+        aggregator.reader.open_files()
+        aggregator.loop.fx.pan = -1.
+        left = aggregator.read_and_mix()
+        np.testing.assert_allclose(left[:, 1], 0., atol=1e-6)
+        np.testing.assert_allclose(left[:, 0], center[:, 0],
+                                   rtol=1e-5, atol=1e-6)
+
+    def test_pull_render_wraps(self):
+        """Rendering in 'pull' mode reports where the loop restarted"""
+        aggregator = create_aggregator(mode='pull')
+        aggregator.start()
+        self.assertIsNone(aggregator.thread)
+
+        outdata = np.empty((2048, 2), dtype='float32')
+        frames = len(aggregator.reader.files[0].data)
+        restarts = []
+        for _ in range(frames // 2048 + 2):
+            restart = aggregator.render(outdata)
+            if restart is not None:
+                restarts.append(restart)
+        aggregator.stop()
+        self.assertEqual(restarts, [frames % 2048])
+
+    def test_steady_state_allocates_no_blocks(self):
+        """Once warmed up, rendering allocates nothing the size of a block
+
+        Only small Python objects, e.g. the read cursor, are allocated,
+        across loop restarts too.
+        """
+        aggregator = create_aggregator(mode='pull')
+        aggregator.start()
+        outdata = np.empty((2048, 2), dtype='float32')
+        for _ in range(10):
+            aggregator.render(outdata)
+        frames = len(aggregator.reader.files[0].data)
+        tracemalloc.start()
+        try:
+            for _ in range(frames // 2048 + 2):
+                aggregator.render(outdata)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            aggregator.stop()
+        self.assertLess(peak, outdata.nbytes // 8)
+
+    def test_push_fills_ring(self):
+        """In 'push' mode the thread keeps the ring buffer filled"""
+        aggregator = create_aggregator(blocksize=4096)
+        aggregator.start()
+        outdata = np.empty((4096, 2), dtype='float32')
+        frames = len(aggregator.reader.files[0].data)
+        restarts = []
+        for _ in range(frames // 4096 + 2):
+            while aggregator.ring.fill < 4096:
+                time.sleep(0.001)
+            restart = aggregator.ring.read_into(outdata)
+            if restart is not None:
+                restarts.append(restart)
+        aggregator.stop()
+        self.assertEqual(restarts, [frames % 4096])
+        self.assertEqual(aggregator.ring.underflows, 0)
+
+    def test_count_in_delays_loop(self):
+        """The loop starts at the exact sample the count-in bar ends"""
+        aggregator = create_aggregator(mode='pull')
+        met = aggregator.loop.met
+        met.bpm, met.beats, met.is_on, met.count_in = 120, 4, True, True
+        aggregator.start()
+        count_in = aggregator.count_in_remaining
+        self.assertEqual(count_in, 88200)
+
+        outdata = np.empty((2048, 2), dtype='float32')
+        restarts = [aggregator.render(outdata)
+                    for _ in range(count_in // 2048 + 1)]
+        aggregator.stop()
+        self.assertEqual(restarts[-1], count_in % 2048)
+        self.assertEqual(restarts[:-1], [None] * (count_in // 2048))
+
+    def test_start_loads_clicks(self):
+        """The clicks are loaded before playback, not in the callback"""
+        ClickTrack._clicks = None
+        aggregator = create_aggregator(mode='pull')
+        aggregator.start()
+        aggregator.stop()
+        self.assertIsNotNone(ClickTrack._clicks)
+
+    def test_block_aligned_count_in_restarts(self):
+        """A count-in ending with a block restarts the loop at the next
+
+        At 136 bpm a bar is exactly 38 blocks of 2048 frames. The restart
+        goes through the ring buffer, as in 'push' mode.
+        """
+        aggregator = create_aggregator(mode='pull')
+        met = aggregator.loop.met
+        met.bpm, met.beats, met.is_on, met.count_in = 136, 4, True, True
+        aggregator.start()
+        self.assertEqual(aggregator.count_in_remaining, 38 * 2048)
+
+        block = np.empty((2048, 2), dtype='float32')
+        restarts = []
+        for _ in range(40):
+            restart = aggregator.render(block)
+            aggregator.ring.write(block, restart=restart)
+            restarts.append(aggregator.ring.read_into(block))
+        aggregator.stop()
+        self.assertEqual(restarts, [None] * 38 + [0, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+from audnauseum.audio_tools.aggregator import Aggregator
+from audnauseum.audio_tools.audio_backend import VirtualBackend
+from audnauseum.audio_tools.device_manager import DeviceManager
+from audnauseum.audio_tools.offline_renderer import OfflineRenderer
+from audnauseum.audio_tools.player import Player
+from audnauseum.audio_tools.recorder import Recorder
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.data_models.loop import Loop
+from audnauseum.data_models.track import Track
+
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+BASS = 'resources/recordings/bass4-4.wav'
+
+
+class VirtualBackendTest(unittest.TestCase):
+    """Test methods for driving the engine with a virtual audio device"""
+
+    def test_manual_playback_matches_render(self):
+        """Stepping the device plays exactly the offline mixdown"""
+        loop = Loop(tracks=[Track(BASS)])
+        backend = VirtualBackend(mode='manual', blocksize=512)
+        player = Player(loop=loop, blocksize=512)
+        reader = WavReader(loop, blocksize=512)
+        player.source = Aggregator(loop, player.ring, reader, mode='pull')
+        devices = DeviceManager(player, blocksize=512, backend=backend)
+        devices.open()
+        player.source.start()
+        player.play()
+        backend.step(20)
+        devices.close()
+
+        expected = OfflineRenderer().render(loop)[:20 * 512]
+        np.testing.assert_allclose(backend.output(), expected, atol=1e-6)
+        self.assertEqual(loop.audio_cursor, 20 * 512)
+
+    def test_scripted_input_is_recorded(self):
+        signal = np.linspace(-0.5, 0.5, 1000, dtype='float32')[:, np.newaxis]
+        backend = VirtualBackend(mode='manual', input_signal=signal,
+                                 channels=(1, 2), blocksize=256)
+        player = Player(blocksize=256)
+        recorder = Recorder(channels=1)
+        devices = DeviceManager(player, recorder, duplex=True, blocksize=256,
+                                backend=backend)
+        devices.open()
+        with tempfile.TemporaryDirectory() as directory:
+            recorder.directory = directory
+            recorder.on_rec()
+            backend.step(8)
+            recorder.recording = False
+            backend.step(1)
+            recorder.on_stop()
+            recorder.finalized.wait()
+        devices.close()
+
+        expected = signal[np.arange(8 * 256) % 1000]
+        np.testing.assert_array_equal(recorder.take, expected)
+
+    def test_overrun_is_an_xrun(self):
+        """A callback slower than its block is flagged like a device does"""
+        backend = VirtualBackend(mode='realtime', blocksize=256)
+        flagged = []
+
+        def slow_callback(outdata, frames, time_info, status):
+            flagged.append(status.output_underflow)
+            outdata[:] = 0
+            time.sleep(2 * frames / 44100)
+
+        stream = backend.OutputStream(callback=slow_callback, channels=2)
+        stream.start()
+        time.sleep(0.1)
+        stream.close()
+        self.assertGreater(backend.xruns, 0)
+        self.assertTrue(any(flagged))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+from audnauseum.audio_tools.auto_tuner import AutoTuner, load_tuning, save_tuning
+from audnauseum.data_models.loop import Loop
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class AutoTunerTest(unittest.TestCase):
+    """Test methods for the block size and buffer auto-tuner"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'settings.json')
+        # An empty settings file, as shipped
+        open(self.path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_tuning_saved_per_device(self):
+        self.assertIsNone(load_tuning('speakers', self.path))
+        save_tuning('speakers', {'blocksize': 512}, self.path)
+        save_tuning('headphones', {'blocksize': 256}, self.path)
+        self.assertEqual(load_tuning('speakers', self.path), {'blocksize': 512})
+        self.assertEqual(load_tuning('headphones', self.path)['blocksize'], 256)
+
+    def test_candidates_lowest_latency_first(self):
+        candidates = AutoTuner(Loop()).candidates()
+        latencies = [buffer_frames for _, buffer_frames in candidates]
+        self.assertEqual(latencies, sorted(latencies))
+        self.assertEqual(candidates[0], (256, 512))
+
+    def test_pull_mode_only_tries_block_sizes(self):
+        candidates = AutoTuner(Loop(), mode='pull').candidates()
+        self.assertEqual([blocksize for blocksize, _ in candidates],
+                         [256, 512, 1024, 2048, 4096])
+
+    def test_stable(self):
+        stats = {'underflows': 0, 'output_underflows': 0, 'load': 0.3}
+        self.assertTrue(AutoTuner.is_stable(stats))
+        stats['output_underflows'] = 1
+        self.assertFalse(AutoTuner.is_stable(stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
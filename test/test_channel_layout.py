@@ -0,0 +1,54 @@
+from audnauseum.audio_tools.channel_layout import downmix_matrix, normalize_layout
+
+import unittest
+
+import numpy as np
+
+
+class ChannelLayoutTest(unittest.TestCase):
+    """Test methods for normalizing tracks to the mixer's layout"""
+
+    def test_stereo_unchanged(self):
+        data = np.zeros((10, 2), dtype='float32')
+        self.assertIs(normalize_layout(data), data)
+
+    def test_mono_is_broadcast(self):
+        """Mono is viewed as stereo without copying"""
+        data = np.arange(10, dtype='float32')[:, np.newaxis]
+        stereo = normalize_layout(data)
+        self.assertEqual(stereo.shape, (10, 2))
+        self.assertEqual(stereo.strides[1], 0)
+        self.assertFalse(stereo.flags.writeable)
+        np.testing.assert_array_equal(stereo[:, 1], range(10))
+
+    def test_downmix(self):
+        """Quad sums each side's front and surround, with a cached matrix"""
+        data = np.ones((10, 4), dtype='float32')
+        data[:, 1] = 0
+        stereo = normalize_layout(data)
+        scale = np.sqrt(1.5)
+        np.testing.assert_allclose(stereo[:, 0], (1 + 1 / np.sqrt(2)) / scale)
+        np.testing.assert_allclose(stereo[:, 1], 1 / np.sqrt(2) / scale)
+        self.assertIs(downmix_matrix(4), downmix_matrix(4))
+
+    def test_downmix_5_1_is_symmetric(self):
+        """5.1 in WAV order (L R C LFE Ls Rs) downmixes to balanced stereo"""
+        matrix = downmix_matrix(6)
+        # Swapping every left speaker with its right mirrors the output
+        np.testing.assert_allclose(matrix[[1, 0, 2, 3, 5, 4]], matrix[:, ::-1])
+        np.testing.assert_allclose(matrix[2, 0], matrix[2, 1])
+        np.testing.assert_allclose(matrix[3, 0], matrix[3, 1])
+        self.assertEqual(matrix[0, 1], 0)
+        self.assertEqual(matrix[4, 1], 0)
+
+        stereo = normalize_layout(np.ones((10, 6), dtype='float32'))
+        np.testing.assert_allclose(stereo[:, 0], stereo[:, 1])
+
+    def test_downmix_3_channels_is_balanced(self):
+        """The centre of L R C goes to both sides equally"""
+        stereo = normalize_layout(np.ones((10, 3), dtype='float32'))
+        np.testing.assert_allclose(stereo[:, 0], stereo[:, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
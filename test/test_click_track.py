@@ -0,0 +1,68 @@
+from audnauseum.metronome.click_track import ClickTrack
+from audnauseum.metronome.metronome import Metronome
+
+import unittest
+
+import numpy as np
+
+
+def click_starts(out):
+    """Frame offsets at which a click starts after silence"""
+    sounding = out[:, 0] != 0
+    return list(np.flatnonzero(sounding[1:] & ~sounding[:-1]) + 1) \
+        + ([0] if sounding[0] else [])
+
+
+class ClickTrackTest(unittest.TestCase):
+    """Test methods for the sample-accurate metronome ClickTrack"""
+
+    def setUp(self):
+        # 120 bpm at 44100 Hz puts a beat every 22050 samples
+        self.met = Metronome(bpm=120, beats=4, volume=1., is_on=True)
+        self.clicks = ClickTrack(samplerate=44100)
+        # Flat clicks, the real samples cross zero within a click
+        self.clicks.down_beat = np.ones(100, dtype='float32')
+        self.clicks.beat = np.full(100, 0.5, dtype='float32')
+
+    def test_clicks_on_beats(self):
+        out = np.zeros((44100 * 2, 2), dtype='float32')
+        self.clicks.render(out, self.met, position=0)
+        self.assertEqual(sorted(click_starts(out)), [0, 22050, 44100, 66150])
+        # The first beat of the bar is the down beat
+        self.assertEqual(out[0, 0], 1.)
+        self.assertEqual(out[22050, 0], 0.5)
+
+    def test_blocks_match_whole_render(self):
+        """Rendering block by block gives the same clicks"""
+        whole = np.zeros((44100, 2), dtype='float32')
+        self.clicks.render(whole, self.met, position=0)
+        blocks = np.zeros((44100, 2), dtype='float32')
+        for start in range(0, 44100, 2048):
+            self.clicks.render(blocks[start:start + 2048], self.met, start)
+        np.testing.assert_allclose(blocks, whole)
+
+    def test_restart_continues_from_zero(self):
+        out = np.zeros((2048, 2), dtype='float32')
+        self.clicks.render(out, self.met, position=30000, restart=1000)
+        self.assertEqual(click_starts(out), [1000])
+
+    def test_count_in(self):
+        self.assertEqual(self.clicks.count_in_frames(self.met), 0)
+        self.met.count_in = True
+        self.assertEqual(self.clicks.count_in_frames(self.met), 88200)
+        out = np.zeros((88200, 2), dtype='float32')
+        self.clicks.render(out, self.met, position=-88200)
+        self.assertEqual(sorted(click_starts(out)), [0, 22050, 44100, 66150])
+
+    def test_off(self):
+        self.met.is_on = False
+        out = np.zeros((4096, 2), dtype='float32')
+        self.clicks.render(out, self.met, position=0)
+        self.assertFalse(out.any())
+
+    def test_samples_loaded_once(self):
+        self.assertIs(ClickTrack().beat, ClickTrack().beat)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+from audnauseum.audio_tools.audio_backend import set_backend
+from audnauseum.headless import Headless, main
+
+import io
+import os
+import tempfile
+import unittest
+
+import soundfile as sf
+
+BASS = 'resources/recordings/bass4-4.wav'
+
+
+class FakeLooper:
+    """Stands in for a Looper, records the calls made to it"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append((name, *args))
+            return True
+        return call
+
+
+class HeadlessTest(unittest.TestCase):
+    """Test methods for driving the Looper from text commands"""
+
+    def test_commands_drive_looper(self):
+        looper = FakeLooper()
+        script = io.StringIO('# comment\n'
+                             'load "my loop.json"\n'
+                             '\n'
+                             'volume 80\n'
+                             'play\n'
+                             'wait 0\n'
+                             'stop\n')
+        self.assertTrue(Headless(looper).run(script))
+        self.assertEqual(looper.calls, [('load', 'my loop.json'),
+                                        ('set_volume', 80),
+                                        ('play',), ('stop',)])
+
+    def test_quit_ends_script(self):
+        looper = FakeLooper()
+        Headless(looper).run(['play', 'quit', 'stop'])
+        self.assertEqual(looper.calls, [('play',)])
+
+    def test_failures_reported(self):
+        headless = Headless(FakeLooper())
+        self.assertFalse(headless.execute('bogus'))
+        self.assertFalse(headless.execute('volume', 'loud'))
+        self.assertFalse(headless.run(['play', 'bpm']))
+
+    def test_documented_example(self):
+        """The example of the docs runs on the virtual device"""
+        with tempfile.TemporaryDirectory() as directory:
+            script = os.path.join(directory, 'session.txt')
+            output = os.path.join(directory, 'bass.flac')
+            with open(script, 'w') as f:
+                f.write(f'add {BASS}\n'
+                        'play\n'
+                        'wait 0.1\n'
+                        'stop\n'
+                        f'render {output} 4\n'
+                        'quit\n')
+            try:
+                status = main(['--loop', 'resources/json/default.json',
+                               '--backend', 'virtual', script])
+            finally:
+                set_backend(None)
+            self.assertEqual(status, 0)
+            self.assertEqual(sf.info(output).frames, 4 * 423362)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,7 @@
 import unittest
+from unittest import mock
+from audnauseum.audio_tools.audio_backend import VirtualBackend
+from audnauseum.constants import BLOCK_SIZE, SAMPLE_RATE
 from audnauseum.state_machine.looper import Looper, LooperStates
 
 
@@ -36,3 +39,49 @@ class LooperStateTransitionsTest(unittest.TestCase):
         self.assertEqual(looper.state, LooperStates.PAUSED)
 
     # TODO: The rest of the state transitions can be tested
+
+
+class LooperStartupTest(unittest.TestCase):
+
+    def test_devices_opened_on_first_play(self):
+        """Starting up neither probes nor opens the audio devices"""
+        backend = VirtualBackend(mode='manual', channels=(1, 2))
+        looper = Looper(backend=backend)
+        self.assertFalse(looper.devices.is_open)
+        self.assertIsNone(looper.recorder)
+        self.assertEqual(looper.loop.tracks, [])
+
+        looper.add_track('resources/recordings/bass4-4.wav')
+        looper.play()
+        self.assertTrue(looper.devices.is_open)
+        self.assertEqual(looper.recorder.channels, 1)
+        backend.step(2)
+        self.assertEqual(looper.loop.audio_cursor, 2 * looper.player.blocksize)
+        looper.shut_down(None)
+
+    def test_tuned_buffer_applied(self):
+        """A tuning that only changes the buffer is applied too"""
+        backend = VirtualBackend(mode='manual', channels=(1, 2))
+        looper = Looper(backend=backend)
+        tuning = {'blocksize': BLOCK_SIZE, 'buffer_frames': 3 * BLOCK_SIZE,
+                  'mode': looper.engine_mode}
+        with mock.patch('audnauseum.state_machine.looper.load_tuning',
+                        return_value=tuning):
+            looper.open_devices()
+        self.assertEqual(looper.player.blocksize, BLOCK_SIZE)
+        self.assertEqual(looper.player.ring.capacity, 3 * BLOCK_SIZE)
+        looper.shut_down(None)
+
+
+class LooperTrackFxTest(unittest.TestCase):
+
+    def test_slip_wraps_to_loop_length(self):
+        """A track's slip wraps at the master track's length, not its own"""
+        looper = Looper(backend=VirtualBackend(mode='manual', channels=(1, 2)))
+        looper.add_track('resources/recordings/bass4-4.wav')
+        looper.add_track('resources/recordings/beat4-4.wav')
+        master, track = looper.loop.tracks
+        length = master.samples * SAMPLE_RATE // master.samplerate
+        looper.track_set_slip(track, (length + 10) * 1000 / SAMPLE_RATE)
+        self.assertEqual(track.fx.slip, 10)
+        looper.shut_down(None)
@@ -0,0 +1,96 @@
+from audnauseum.audio_tools.mixer import Mixer, balance_matrix, pan_matrices
+
+import unittest
+
+import numpy as np
+
+
+class MixerTest(unittest.TestCase):
+    """Test methods for the batched Mixer"""
+
+    def test_matches_weighted_sum(self):
+        """The matrix product equals the per-track weighted sum"""
+        mixer = Mixer(blocksize=64, tracks=5)
+        rng = np.random.default_rng(1)
+        mixer.stack[:] = rng.uniform(-1, 1, mixer.stack.shape)
+        gains = rng.uniform(0, 1, 5)
+        mixer.set_gains(gains)
+
+        out = np.empty((64, 2), dtype='float32')
+        mixer.mix(out)
+        expected = np.einsum('ftc,t->fc', mixer.stack, gains)
+        np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-6)
+
+    def test_mix_in_place(self):
+        """The mix is written into the given block"""
+        mixer = Mixer(blocksize=16, tracks=2)
+        mixer.stack[:] = 1
+        mixer.set_gains([0.25, 0.5])
+        out = np.empty((16, 2), dtype='float32')
+        self.assertIs(mixer.mix(out), out)
+        np.testing.assert_allclose(out, 0.75)
+
+    def test_no_tracks(self):
+        mixer = Mixer(blocksize=16)
+        out = np.ones((16, 2), dtype='float32')
+        mixer.mix(out)
+        self.assertFalse(out.any())
+
+    def test_resize_keeps_stack(self):
+        """The stack is only reallocated when the track count changes"""
+        mixer = Mixer(blocksize=16, tracks=3)
+        stack = mixer.stack
+        mixer.resize(3)
+        self.assertIs(mixer.stack, stack)
+        mixer.resize(4)
+        self.assertEqual(mixer.stack.shape, (16, 4, 2))
+
+    def test_center_pan_is_minus_3_db(self):
+        np.testing.assert_allclose(pan_matrices([0.])[0], np.eye(2) / np.sqrt(2),
+                                   rtol=1e-6)
+
+    def test_pan_is_constant_power(self):
+        """The power of a mono track is the same at every pan"""
+        for pan in np.linspace(-1, 1, 9):
+            matrix = pan_matrices([pan])[0]
+            np.testing.assert_allclose((matrix ** 2).sum(), 1., rtol=1e-6)
+
+    def test_mono_track_pan(self):
+        """A mono track never gets louder than unity on either side"""
+        mixer = Mixer(blocksize=4, tracks=1)
+        mixer.stack[:] = 1
+        out = np.empty((4, 2), dtype='float32')
+        for pan, expected in [(-1., [1., 0.]), (0., [0.7071068, 0.7071068]),
+                              (1., [0., 1.])]:
+            mixer.set_gains([1.], pans=[pan])
+            mixer.mix(out)
+            np.testing.assert_allclose(out, [expected] * 4, atol=1e-6)
+        for pan in np.linspace(-1, 1, 9):
+            mixer.set_gains([1.], pans=[pan])
+            mixer.mix(out)
+            self.assertLessEqual(out.max(), 1. + 1e-6)
+
+    def test_master_pan_is_balance(self):
+        """The loop's pan turns down the other side, center is unity"""
+        np.testing.assert_allclose(balance_matrix(0.), np.eye(2))
+        np.testing.assert_allclose(balance_matrix(0.5), np.diag([0.5, 1.]))
+        np.testing.assert_allclose(balance_matrix(-1.), np.diag([1., 0.]))
+
+    def test_master_pan_follows_track_pan(self):
+        """The master pan applies after each track's pan"""
+        mixer = Mixer(blocksize=4, tracks=3)
+        rng = np.random.default_rng(2)
+        mixer.stack[:] = rng.uniform(-1, 1, mixer.stack.shape)
+        gains, pans = [0.5, 1., 0.25], [-0.5, 0., 0.75]
+        mixer.set_gains(gains, pans=pans, master_pan=0.3)
+
+        out = np.empty((4, 2), dtype='float32')
+        mixer.mix(out)
+        tracks = np.einsum('ftc,tcd->ftd', mixer.stack,
+                           pan_matrices(pans)) * np.asarray(gains)[:, None]
+        expected = tracks.sum(axis=1) @ balance_matrix(0.3)
+        np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
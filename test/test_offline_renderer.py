@@ -0,0 +1,64 @@
+from audnauseum.audio_tools.aggregator import Aggregator
+from audnauseum.audio_tools.offline_renderer import OfflineRenderer, render_files
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.constants import SAMPLE_RATE
+from audnauseum.data_models.loop import Loop
+from audnauseum.data_models.track import Track
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+BASS = 'resources/recordings/bass4-4.wav'
+BEAT = 'resources/recordings/beat4-4.wav'
+# Recorded at 48 kHz
+ELECTRO = 'resources/recordings/electro_100bpm_2measures.wav'
+
+
+class OfflineRendererTest(unittest.TestCase):
+    """Test methods for rendering Loops to audio files"""
+
+    def test_render_matches_playback_mix(self):
+        """Offline blocks mix the same audio as playback blocks"""
+        loop = Loop(tracks=[Track(BASS), Track(BEAT)])
+        audio = OfflineRenderer(repetitions=2, blocksize=3000).render(loop)
+        self.assertEqual(audio.shape, (2 * Track(BASS).samples, 2))
+
+        reader = WavReader(loop, blocksize=2048)
+        aggregator = Aggregator(loop, None, reader, mode='pull')
+        reader.open_files()
+        expected = np.concatenate([aggregator.read_and_mix().copy()
+                                   for _ in range(4)])
+        np.testing.assert_allclose(audio[:expected.shape[0]], expected,
+                                   rtol=1e-5, atol=1e-6)
+
+    def test_render_resamples_to_engine_rate(self):
+        """A 48 kHz track renders as many frames as it plays"""
+        info = sf.info(ELECTRO)
+        self.assertEqual(info.samplerate, 48000)
+        audio = OfflineRenderer().render(Loop(tracks=[Track(ELECTRO)]))
+        self.assertEqual(audio.shape[0],
+                         round(info.frames * SAMPLE_RATE / info.samplerate))
+
+    def test_render_files_writes_each_loop(self):
+        with tempfile.TemporaryDirectory() as directory:
+            loop_paths = []
+            for name in ('one', 'two'):
+                loop_path = os.path.join(directory, f'{name}.json')
+                with open(loop_path, 'w') as f:
+                    f.write(Loop(tracks=[Track(BASS)]).to_json())
+                loop_paths.append(loop_path)
+
+            output = os.path.join(directory, 'renders')
+            results = render_files(loop_paths, output, repetitions=3,
+                                   format='flac', workers=1)
+            self.assertEqual(len(results), 2)
+            info = sf.info(os.path.join(output, 'two.flac'))
+            self.assertEqual(info.frames, 3 * Track(BASS).samples)
+
+
+if __name__ == '__main__':
+    unittest.main()
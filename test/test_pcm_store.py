@@ -0,0 +1,84 @@
+from audnauseum.audio_tools.pcm_store import PcmStore
+from audnauseum.audio_tools.track_cache import TrackCache
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+
+class PcmStoreTest(unittest.TestCase):
+    """Test methods for the memory-mapped PCM sidecar store"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = PcmStore(directory=os.path.join(self.directory, 'pcm'))
+        self.wav = os.path.join(self.directory, 'take.wav')
+        self.data = np.random.default_rng(0).uniform(
+            -0.5, 0.5, (1000, 2)).astype('float32')
+        sf.write(self.wav, self.data, 44100, subtype='FLOAT')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_open_maps_sidecar(self):
+        """The sidecar holds the same samples as the source file"""
+        data = self.store.open(self.wav)
+        self.assertIsInstance(data, np.memmap)
+        self.assertFalse(data.flags.writeable)
+        np.testing.assert_array_equal(data, self.data)
+
+    def test_converted_once(self):
+        self.assertTrue(self.store.ensure(self.wav))
+        self.assertFalse(self.store.ensure(self.wav))
+
+    def test_conversion_holds_only_its_own_file(self):
+        """Requesting another file never waits on a running conversion"""
+        other = os.path.join(self.directory, 'other.wav')
+        sf.write(other, self.data, 44100, subtype='FLOAT')
+        # Stands in for a conversion of the take in progress
+        with self.store.path_lock(self.wav):
+            future = self.store.ensure_in_background(self.wav)
+            self.assertTrue(self.store.ensure(other))
+            self.assertFalse(future.done())
+        self.assertTrue(future.result(timeout=10))
+
+    def test_invalidated_on_change(self):
+        """A changed source file gets a new sidecar"""
+        self.store.ensure(self.wav)
+        sf.write(self.wav, self.data[:500], 44100, subtype='FLOAT')
+        self.assertFalse(self.store.is_valid(self.wav))
+        self.assertTrue(self.store.ensure(self.wav))
+        self.assertEqual(self.store.open(self.wav).shape, (500, 2))
+
+    def test_cache_blocks_are_views(self):
+        """Blocks served through the TrackCache don't copy the mapping"""
+        cache = TrackCache(store=self.store)
+        data = cache.get(self.wav)
+        block = data[100:200]
+        self.assertTrue(np.shares_memory(block, data))
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_resampled_to_engine_rate(self):
+        """A 48 kHz file is stored at 44.1 kHz with the same pitch"""
+        wav = os.path.join(self.directory, 'sample48k.wav')
+        tone = np.sin(2 * np.pi * 1000 * np.arange(48000) / 48000)
+        sf.write(wav, np.stack([tone, tone], axis=1), 48000, subtype='FLOAT')
+        data = self.store.open(wav)
+        self.assertEqual(data.shape, (44100, 2))
+        self.assertEqual(self.store.read_header(wav)['source_samplerate'], 48000)
+        spectrum = np.abs(np.fft.rfft(data[:, 0]))
+        self.assertAlmostEqual(
+            np.fft.rfftfreq(44100, 1 / 44100)[spectrum.argmax()], 1000, delta=1)
+        self.assertFalse(self.store.ensure(wav))
+
+    def test_ensure_in_background(self):
+        self.assertTrue(self.store.ensure_in_background(self.wav).result())
+        self.assertTrue(self.store.is_valid(self.wav))
+
+
+if __name__ == '__main__':
+    unittest.main()
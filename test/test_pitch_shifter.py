@@ -0,0 +1,109 @@
+from audnauseum.audio_tools.pitch_shifter import PitchShifter, shift_pitch
+from audnauseum.audio_tools.track_cache import TrackCache
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.data_models.fx_settings import FxSettings
+from audnauseum.data_models.loop import Loop
+
+import time
+import unittest
+
+import numpy as np
+
+
+class FakeTrack:
+    """Stands in for a Track whose audio is put into the cache directly"""
+
+    def __init__(self, file_name, pitch_adjust=0):
+        self.file_name = file_name
+        self.fx = FxSettings(pitch_adjust=pitch_adjust)
+
+
+def sine(frequency, frames=44100):
+    """One second of a stereo sine wave"""
+    values = np.sin(2 * np.pi * frequency * np.arange(frames) / 44100)
+    return np.repeat(values, 2).reshape(frames, 2).astype('float32')
+
+
+def peak_frequency(data):
+    spectrum = np.abs(np.fft.rfft(data[:, 0]))
+    return np.fft.rfftfreq(data.shape[0], 1 / 44100)[spectrum.argmax()]
+
+
+class PitchShifterTest(unittest.TestCase):
+    """Test methods for the background pitch shift renderer"""
+
+    def test_octave_up(self):
+        """Shifting 12 semitones doubles the frequency, keeps the length"""
+        shifted = shift_pitch(sine(440), 12)
+        self.assertEqual(shifted.shape, (44100, 2))
+        self.assertEqual(shifted.dtype, np.float32)
+        self.assertAlmostEqual(peak_frequency(shifted), 880, delta=5)
+
+    def test_fifth_down(self):
+        shifted = shift_pitch(sine(440), -7)
+        self.assertAlmostEqual(peak_frequency(shifted), 440 * 2 ** (-7 / 12),
+                               delta=5)
+
+    def test_render_is_cached(self):
+        """Switching back to a rendered offset doesn't render again"""
+        cache = TrackCache()
+        cache.put('tone', sine(440))
+        shifter = PitchShifter(cache, workers=1)
+        try:
+            self.assertIsNone(shifter.rendered('tone', cache.get('tone'), 5))
+            shifter.request('tone', 5).result(timeout=60)
+            shifter.request('tone', -5).result(timeout=60)
+            self.assertIsNone(shifter.request('tone', 5))
+            rendered = shifter.rendered('tone', cache.get('tone'), 5)
+            self.assertEqual(rendered.shape, (44100, 2))
+            self.assertEqual(shifter.stats()['tracks'], 2)
+        finally:
+            shifter.shut_down()
+
+    def test_render_in_calling_thread(self):
+        """An offline render is cached without starting the pool"""
+        cache = TrackCache()
+        cache.put('tone', sine(440))
+        shifter = PitchShifter(cache)
+        rendered = shifter.render('tone', 12)
+        self.assertAlmostEqual(peak_frequency(rendered), 880, delta=5)
+        self.assertIsNone(shifter.request('tone', 12))
+        self.assertIsNone(shifter._executor)
+
+    def test_render_name_follows_content(self):
+        """A track recorded again to the same path and length isn't stale"""
+        name = PitchShifter.render_name('tone', sine(440), 12)
+        self.assertEqual(name, PitchShifter.render_name('tone', sine(440), 12))
+        self.assertNotEqual(name, PitchShifter.render_name('tone', sine(330), 12))
+        self.assertNotEqual(name, PitchShifter.render_name('tone', sine(440), 7))
+
+    def test_swapped_at_restart(self):
+        """The reader keeps the original until the loop restarts"""
+        cache = TrackCache()
+        cache.put('tone', sine(440, frames=8192))
+        shifter = PitchShifter(cache, workers=1)
+        loop = Loop(tracks=[FakeTrack('tone', pitch_adjust=12)])
+        reader = WavReader(loop, blocksize=2048, track_cache=cache,
+                           pitch_shifter=shifter)
+        try:
+            reader.open_files()
+            original = reader.files[0].data
+            self.assertIs(original, cache.get('tone'))
+            shifter.request('tone', 12).result(timeout=60)
+            # The render is staged by the pool's thread once it's stored
+            deadline = time.perf_counter() + 10
+            while reader.files[0].staged is original and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            stack = np.empty((2048, 1, 2), dtype='float32')
+            reader.read_into(stack)
+            self.assertIs(reader.files[0].data, original)
+
+            for _ in range(4):
+                reader.read_into(stack)
+            self.assertIsNot(reader.files[0].data, original)
+        finally:
+            shifter.shut_down()
+
+
+if __name__ == '__main__':
+    unittest.main()
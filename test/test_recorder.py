@@ -0,0 +1,156 @@
+from audnauseum.audio_tools import recorder as recorder_module
+from audnauseum.audio_tools.audio_backend import CallbackFlags, VirtualBackend
+from audnauseum.audio_tools.device_manager import DeviceManager
+from audnauseum.audio_tools.player import Player
+from audnauseum.audio_tools.recorder import Recorder
+from audnauseum.constants import RECORDER_BUFFER_FRAMES, RECORDER_WRITE_FRAMES
+from audnauseum.data_models.track import Track
+
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+
+class SlowFile:
+    """Stands in for a SoundFile on a disk that stalls on its first write
+
+    Records the frames of every write.
+    """
+
+    def __init__(self, **kwargs):
+        self.writes = []
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        SlowFile.last = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def write(self, data):
+        self.writing.set()
+        self.release.wait(timeout=10)
+        self.writes.append(data.shape[0])
+
+
+class RecorderTest(unittest.TestCase):
+    """Test methods for capturing takes from the input callback"""
+
+    def test_failed_writer_does_not_block_stop(self):
+        """A file that can't be created ends the take without a Track"""
+        recorder = Recorder(channels=1)
+        block = np.zeros((256, 1), dtype='float32')
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(recorder_module.sf, 'SoundFile',
+                                  side_effect=OSError('disk full')):
+            recorder.directory = directory
+            recorder.on_rec()
+            recorder.audio_callback(block, 256, None, CallbackFlags())
+            recorder.recording = False
+            recorder.audio_callback(block, 256, None, CallbackFlags())
+            self.assertIsNone(recorder.on_stop())
+        self.assertIsInstance(recorder.error, OSError)
+        self.assertTrue(recorder.finalized.wait(timeout=1))
+        self.assertIsNone(recorder.get_current_file())
+
+    def test_slow_writer_overflows_ring(self):
+        """Blocks captured while the disk stalls fill the ring, then drop
+
+        The writer drains the ring in batches of RECORDER_WRITE_FRAMES.
+        """
+        blocksize = 2048
+        backend = VirtualBackend(mode='manual', channels=(1, 2),
+                                 blocksize=blocksize,
+                                 input_signal=np.ones((blocksize, 1)))
+        recorder = Recorder(channels=1)
+        devices = DeviceManager(Player(blocksize=blocksize), recorder,
+                                duplex=True, blocksize=blocksize, backend=backend)
+        devices.open()
+        batch_blocks = RECORDER_WRITE_FRAMES // blocksize
+        ring_blocks = RECORDER_BUFFER_FRAMES // blocksize
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(recorder_module.sf, 'SoundFile', SlowFile):
+            recorder.directory = directory
+            recorder.on_rec()
+            # The first batch is drained, then its write stalls
+            backend.step(batch_blocks)
+            self.assertTrue(SlowFile.last.writing.wait(timeout=10))
+            deadline = time.perf_counter() + 10
+            while recorder.ring.fill and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            backend.step(ring_blocks + 5)
+            stats = recorder.stats()
+            SlowFile.last.release.set()
+
+            recorder.recording = False
+            backend.step(1)
+            track = recorder.on_stop()
+            self.assertTrue(recorder.finalized.wait(timeout=10))
+        devices.close()
+
+        self.assertEqual(stats['overflows'], 5)
+        self.assertEqual(stats['fill'], RECORDER_BUFFER_FRAMES)
+        self.assertEqual(stats['fill_high'], RECORDER_BUFFER_FRAMES)
+        self.assertEqual(stats['input_overflows'], 0)
+        self.assertEqual(recorder.stats()['fill'], 0)
+
+        frames = (batch_blocks + ring_blocks) * blocksize
+        self.assertEqual(track.samples, frames)
+        # The take outgrew its first buffer
+        np.testing.assert_array_equal(recorder.take, np.ones((frames, 1)))
+        self.assertEqual(SlowFile.last.writes,
+                         [RECORDER_WRITE_FRAMES] * (frames // RECORDER_WRITE_FRAMES))
+
+    def record(self, recorder: Recorder, blocks: int) -> Track:
+        """Records `blocks` blocks of ones, returns the Track"""
+        block = np.ones((2048, 1), dtype='float32')
+        recorder.on_rec()
+        for _ in range(blocks):
+            recorder.audio_callback(block, 2048, None, CallbackFlags())
+        recorder.recording = False
+        recorder.audio_callback(block, 2048, None, CallbackFlags())
+        return recorder.on_stop()
+
+    def test_long_take_plays_from_file(self):
+        """A take longer than RECORDER_TAKE_FRAMES isn't kept in memory"""
+        recorder = Recorder(channels=1)
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(recorder_module, 'RECORDER_TAKE_FRAMES',
+                                  RECORDER_WRITE_FRAMES):
+            recorder.directory = directory
+            track = self.record(recorder, 2 * RECORDER_WRITE_FRAMES // 2048)
+            self.assertIsNone(recorder.take)
+            self.assertTrue(recorder.finalized.is_set())
+            self.assertEqual(track.samples, 2 * RECORDER_WRITE_FRAMES)
+            # The file is 16 bit
+            np.testing.assert_allclose(
+                recorder_module.sf.read(track.file_name, always_2d=True)[0],
+                np.ones((2 * RECORDER_WRITE_FRAMES, 1)), atol=1e-4)
+
+    def test_stalled_writer_times_out(self):
+        """A writer that doesn't finish the take ends it without a Track"""
+        recorder = Recorder(channels=1)
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(recorder_module.sf, 'SoundFile', SlowFile), \
+                mock.patch.object(recorder_module, 'RECORDER_STOP_TIMEOUT', 0.1):
+            recorder.directory = directory
+            recorder.on_rec()
+            block = np.ones((2048, 1), dtype='float32')
+            for _ in range(RECORDER_WRITE_FRAMES // 2048):
+                recorder.audio_callback(block, 2048, None, CallbackFlags())
+            self.assertTrue(SlowFile.last.writing.wait(timeout=10))
+            recorder.recording = False
+            self.assertIsNone(recorder.on_stop())
+            self.assertIsInstance(recorder.error, TimeoutError)
+            SlowFile.last.release.set()
+            self.assertTrue(recorder.finalized.wait(timeout=10))
+
+
+if __name__ == '__main__':
+    unittest.main()
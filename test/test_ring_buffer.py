@@ -0,0 +1,78 @@
+from audnauseum.audio_tools.ring_buffer import RingBuffer
+
+import unittest
+
+import numpy as np
+
+
+def frames(start, count):
+    """Stereo frames whose samples hold their frame number"""
+    return np.repeat(np.arange(start, start + count, dtype='float32'),
+                     2).reshape(count, 2)
+
+
+class RingBufferTest(unittest.TestCase):
+    """Test methods for the SPSC audio RingBuffer"""
+
+    def test_frames_in_order_across_wrap(self):
+        ring = RingBuffer(capacity=10)
+        out = np.empty((4, 2), dtype='float32')
+        written = 0
+        for _ in range(6):
+            self.assertTrue(ring.write(frames(written, 4)))
+            written += 4
+            ring.read_into(out)
+            np.testing.assert_array_equal(out, frames(written - 4, 4))
+
+    def test_full_ring_rejects_write(self):
+        ring = RingBuffer(capacity=8)
+        self.assertTrue(ring.write(frames(0, 6)))
+        self.assertFalse(ring.write(frames(6, 4)))
+        self.assertEqual(ring.fill, 6)
+        self.assertEqual(ring.space, 2)
+        self.assertEqual(ring.stats()['overflows'], 1)
+
+    def test_underflow_zero_fills(self):
+        ring = RingBuffer(capacity=8)
+        ring.write(frames(1, 2))
+        out = np.ones((4, 2), dtype='float32')
+        ring.read_into(out)
+        np.testing.assert_array_equal(out[:2], frames(1, 2))
+        self.assertFalse(out[2:].any())
+        self.assertEqual(ring.underflows, 1)
+
+    def test_restart_marker(self):
+        """The restart position travels with the frames"""
+        ring = RingBuffer(capacity=10)
+        out = np.empty((4, 2), dtype='float32')
+        ring.write(frames(0, 4))
+        ring.write(frames(0, 4), restart=3)
+        self.assertIsNone(ring.read_into(out))
+        self.assertEqual(ring.read_into(out), 3)
+        # The marker is cleared when its frame is overwritten
+        ring.write(frames(0, 4))
+        ring.write(frames(0, 4))
+        self.assertIsNone(ring.read_into(out))
+        self.assertIsNone(ring.read_into(out))
+
+    def test_restart_marker_across_wrap(self):
+        ring = RingBuffer(capacity=6)
+        out = np.empty((4, 2), dtype='float32')
+        ring.write(frames(0, 4))
+        ring.read_into(out)
+        ring.write(frames(0, 4), restart=3)
+        self.assertEqual(ring.read_into(out), 3)
+
+    def test_fill_statistics(self):
+        ring = RingBuffer(capacity=8)
+        out = np.empty((2, 2), dtype='float32')
+        ring.write(frames(0, 6))
+        ring.read_into(out)
+        stats = ring.stats()
+        self.assertEqual(stats['fill_high'], 6)
+        self.assertEqual(stats['fill_low'], 6)
+        self.assertEqual(stats['fill'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
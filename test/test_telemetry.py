@@ -0,0 +1,54 @@
+from audnauseum.audio_tools.aggregator import Aggregator
+from audnauseum.audio_tools.ring_buffer import RingBuffer
+from audnauseum.audio_tools.telemetry import Histogram, Telemetry
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.data_models.loop import Loop
+from audnauseum.data_models.track import Track
+
+import unittest
+
+BASS = 'resources/recordings/bass4-4.wav'
+
+
+class TelemetryTest(unittest.TestCase):
+    """Test methods for the engine's timing histograms"""
+
+    def test_histogram_buckets(self):
+        histogram = Histogram()
+        for seconds in (3e-6, 3e-6, 3e-6, 100e-6):
+            histogram.record(seconds)
+        summary = histogram.summary()
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['buckets_us'], {4: 3, 128: 1})
+        self.assertEqual(summary['p50'], 4e-6)
+        self.assertEqual(summary['p99'], 128e-6)
+        self.assertEqual(summary['max'], 100e-6)
+
+    def test_disabled_records_nothing(self):
+        telemetry = Telemetry(enabled=False)
+        self.assertIsNone(telemetry.start())
+        telemetry.stop('read', telemetry.start())
+        telemetry.record('callback', 1e-3)
+        durations = telemetry.snapshot()['durations']
+        self.assertTrue(all(d['count'] == 0 for d in durations.values()))
+
+    def test_aggregator_times_read_and_mix(self):
+        loop = Loop(tracks=[Track(BASS)])
+        reader = WavReader(loop, blocksize=1024)
+        aggregator = Aggregator(loop, RingBuffer(4096), reader, mode='push')
+        aggregator.telemetry = Telemetry(enabled=True)
+        aggregator.reader.open_files()
+        for _ in range(3):
+            aggregator.read_and_mix()
+        snapshot = aggregator.telemetry.snapshot(ring=aggregator.ring)
+        self.assertEqual(snapshot['durations']['read']['count'], 3)
+        self.assertEqual(snapshot['durations']['mix']['count'], 3)
+        self.assertIn('fill_high', snapshot['ring'])
+
+        aggregator.telemetry.reset()
+        snapshot = aggregator.telemetry.snapshot()
+        self.assertEqual(snapshot['durations']['read']['count'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
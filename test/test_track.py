@@ -0,0 +1,38 @@
+from audnauseum.data_models.complex_decoder import ComplexDecoder
+from audnauseum.data_models.loop import Loop
+from audnauseum.data_models.track import Track
+
+import json
+import unittest
+
+
+class TrackTest(unittest.TestCase):
+    """Test methods for the Track data model"""
+
+    def test_reads_length_from_file(self):
+        track = Track('resources/recordings/bass4-4.wav')
+        self.assertGreater(track.samples, 0)
+        self.assertEqual(track.samplerate, 44100)
+
+    def test_known_length_skips_file(self):
+        """A just-recorded take doesn't reopen its file"""
+        track = Track('not/written/yet.wav', samples=88200, samplerate=44100)
+        self.assertEqual(track.ms_length, 2000)
+
+    def test_file_opened_when_length_needed(self):
+        track = Track('not/written/yet.wav', beats=4)
+        self.assertEqual(track.file_name, 'not/written/yet.wav')
+        with self.assertRaises(Exception):
+            track.samples
+
+    def test_decoded_length_skips_file(self):
+        """Loading a saved Loop doesn't open its tracks"""
+        saved = Loop(tracks=[Track('moved/away.wav', beats=4, samples=44100,
+                                   samplerate=44100)]).to_json()
+        track = json.loads(saved, cls=ComplexDecoder).tracks[0]
+        self.assertEqual(track.samples, 44100)
+        self.assertEqual(track.bpm, 240)
+
+
+if __name__ == '__main__':
+    unittest.main()
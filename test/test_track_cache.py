@@ -0,0 +1,71 @@
+from audnauseum.audio_tools.track_cache import TrackCache
+
+import unittest
+
+import numpy as np
+
+BASS = 'resources/recordings/bass4-4.wav'
+BEAT = 'resources/recordings/beat4-4.wav'
+
+
+class TrackCacheTest(unittest.TestCase):
+    """Test methods for the decoded TrackCache"""
+
+    def test_decodes_once(self):
+        """The second read of a file is served from memory"""
+        cache = TrackCache()
+        first = cache.get(BASS)
+        second = cache.get(BASS)
+        self.assertIs(first, second)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+
+    def test_float32_read_only(self):
+        """Decoded audio is contiguous float32 and can't be mutated"""
+        data = TrackCache().get(BASS)
+        self.assertEqual(data.dtype.name, 'float32')
+        self.assertEqual(data.ndim, 2)
+        self.assertTrue(data.flags.c_contiguous)
+        self.assertFalse(data.flags.writeable)
+
+    def test_relative_paths_share_entry(self):
+        cache = TrackCache()
+        cache.get(BASS)
+        cache.get('./' + BASS)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.hits, 1)
+
+    def test_lru_eviction(self):
+        """The least recently used track is evicted over the budget"""
+        cache = TrackCache()
+        bass = cache.get(BASS)
+        cache.budget = bass.nbytes + 1
+        cache.get(BEAT)
+        self.assertNotIn(BASS, cache)
+        self.assertIn(BEAT, cache)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.nbytes, cache.get(BEAT).nbytes)
+
+    def test_recently_used_kept(self):
+        cache = TrackCache()
+        bass = cache.get(BASS)
+        cache.get(BEAT)
+        cache.get(BASS)
+        cache.budget = bass.nbytes
+        cache.put('other', bass.copy())
+        self.assertIn('other', cache)
+        self.assertNotIn(BEAT, cache)
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_mono_broadcast(self):
+        """Mono audio is stored as a stereo view, counted at its own size"""
+        cache = TrackCache()
+        mono = np.zeros((1000, 1), dtype='float32')
+        data = cache.put('mono', mono)
+        self.assertEqual(data.shape, (1000, 2))
+        self.assertTrue(np.shares_memory(data, mono))
+        self.assertEqual(cache.nbytes, mono.nbytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
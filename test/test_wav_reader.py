@@ -0,0 +1,144 @@
+from audnauseum.audio_tools.track_cache import TrackCache
+from audnauseum.audio_tools.wav_reader import WavReader
+from audnauseum.data_models.fx_settings import FxSettings
+from audnauseum.data_models.loop import Loop
+
+import unittest
+
+import numpy as np
+
+
+class FakeTrack:
+    """Stands in for a Track whose audio is put into the cache directly"""
+
+    def __init__(self, file_name, slip=0):
+        self.file_name = file_name
+        self.fx = FxSettings(slip=slip)
+
+
+def ramp(frames, start=1):
+    """Stereo audio whose samples hold their frame number plus `start`"""
+    values = np.arange(start, start + frames, dtype='float32')
+    return np.repeat(values, 2).reshape(frames, 2)
+
+
+def create_reader(tracks, blocksize=8):
+    """Creates a reader of (file name, audio, slip) tuples"""
+    cache = TrackCache()
+    for file_name, data, _ in tracks:
+        cache.put(file_name, data)
+    loop = Loop(tracks=[FakeTrack(file_name, slip)
+                        for file_name, _, slip in tracks])
+    reader = WavReader(loop, blocksize=blocksize, track_cache=cache)
+    reader.open_files()
+    return reader
+
+
+class WavReaderTest(unittest.TestCase):
+    """Test methods for reading blocks of Tracks at the loop cursor"""
+
+    def test_gapless_wrap(self):
+        """The head of the next pass follows the tail at the exact sample"""
+        reader = create_reader([('master', ramp(20), 0)])
+        stack = np.empty((8, 1, 2), dtype='float32')
+        played = []
+        restarts = []
+        for _ in range(5):
+            restarts.append(reader.read_into(stack))
+            played.append(stack[:, 0, 0].copy())
+        played = np.concatenate(played)
+        expected = np.concatenate([np.arange(1, 21)] * 2)
+        np.testing.assert_array_equal(played, expected)
+        self.assertEqual(restarts, [None, None, 4, None, None])
+
+    def test_slip_and_short_track(self):
+        """Slipped tracks start late, short tracks end in silence"""
+        reader = create_reader([('master', ramp(12), 0),
+                                ('short', ramp(3, start=100), 5)],
+                               blocksize=12)
+        stack = np.empty((12, 2, 2), dtype='float32')
+        reader.read_into(stack)
+        expected = [0] * 5 + [100, 101, 102] + [0] * 4
+        np.testing.assert_array_equal(stack[:, 1, 0], expected)
+
+    def test_slip_wraps_around_loop(self):
+        """A track slipped near the loop end continues at its start"""
+        reader = create_reader([('master', ramp(12), 0),
+                                ('late', ramp(4, start=100), 10)],
+                               blocksize=12)
+        stack = np.empty((12, 2, 2), dtype='float32')
+        reader.read_into(stack)
+        expected = [102, 103] + [0] * 8 + [100, 101]
+        np.testing.assert_array_equal(stack[:, 1, 0], expected)
+
+    def test_slip_change_applies_next_block(self):
+        reader = create_reader([('master', ramp(16), 0)])
+        stack = np.empty((8, 1, 2), dtype='float32')
+        reader.read_into(stack)
+        reader.loop.tracks[0].fx.slip = 3
+        reader.read_into(stack)
+        np.testing.assert_array_equal(stack[:, 0, 0], range(6, 14))
+
+    def test_added_track_waits_for_restart(self):
+        """A track added during playback starts at the loop's first sample"""
+        reader = create_reader([('master', ramp(10), 0)])
+        stack = np.empty((8, 1, 2), dtype='float32')
+        reader.read_into(stack)
+
+        reader.track_cache.put('added', ramp(10, start=50))
+        reader.add_track('added')
+        reader.admit_tracks()
+        stack = np.empty((8, 2, 2), dtype='float32')
+        self.assertEqual(reader.read_into(stack), 2)
+        np.testing.assert_array_equal(stack[:, 1, 0], [0, 0] + list(range(50, 56)))
+
+    def test_reading_never_touches_cache(self):
+        """Restarts and added tracks are served without the TrackCache"""
+        reader = create_reader([('master', ramp(10), 0)])
+        reader.track_cache.put('added', ramp(10, start=50))
+        reader.add_track('added')
+        stats = reader.track_cache.stats()
+        stack = np.empty((8, 2, 2), dtype='float32')
+        for _ in range(4):
+            reader.admit_tracks()
+            reader.read_into(stack)
+        self.assertEqual(reader.track_cache.stats(), stats)
+
+    def test_staged_audio_swapped_at_restart(self):
+        reader = create_reader([('master', ramp(10), 0)])
+        stack = np.empty((8, 1, 2), dtype='float32')
+        reader.read_into(stack)
+        reader.files[0].staged = ramp(10, start=50)
+        self.assertEqual(reader.read_into(stack), 2)
+        np.testing.assert_array_equal(stack[:, 0, 0], [9, 10] + list(range(50, 56)))
+
+    def test_duplicate_files_keep_own_fx(self):
+        """The same file twice in a loop plays with each Track's settings"""
+        reader = create_reader([('master', ramp(16), 0), ('master', ramp(16), 4)])
+        self.assertIsNot(reader.files[0].fx, reader.files[1].fx)
+        stack = np.empty((8, 2, 2), dtype='float32')
+        reader.read_into(stack)
+        np.testing.assert_array_equal(stack[:, 0, 0], range(1, 9))
+        np.testing.assert_array_equal(stack[:, 1, 0], [13, 14, 15, 16, 1, 2, 3, 4])
+
+    def test_reverse_mid_loop(self):
+        """Reversing takes effect at the next block, without a copy"""
+        reader = create_reader([('master', ramp(16), 0)])
+        stack = np.empty((8, 1, 2), dtype='float32')
+        reader.read_into(stack)
+        reader.files[0].fx.is_reversed = True
+        reader.read_into(stack)
+        np.testing.assert_array_equal(stack[:, 0, 0], range(8, 0, -1))
+        self.assertTrue(np.shares_memory(reader.files[0].data,
+                                         reader.track_cache.get('master')))
+
+    def test_read_to_list(self):
+        reader = create_reader([('master', ramp(20), 0),
+                                ('other', ramp(20, start=30), 0)])
+        blocks = reader.read_to_list()
+        self.assertEqual(len(blocks), 2)
+        np.testing.assert_array_equal(blocks[1][:, 0], range(30, 38))
+
+
+if __name__ == '__main__':
+    unittest.main()